@@ -1,25 +1,76 @@
 import streamlit as st
 import uuid
+import logging
 import numpy as np 
 import utils.genai as llm
 import google.generativeai as genai
 import db.check as db
 from db.fill_query import log_search_transaction, update_feedback_score
+import os
+import time
+import datetime
+from search.graph import load_citation_graph
+from search.snapshot import SNAPSHOT_PATH, current_snapshot
+import search.pipeline as pipeline
+from search.neighbors import similar_cases
+from search.typeahead import load_typeahead_index
+from utils import profiling
 
-nlp = llm.load_nlp()
-gemini = llm.gemini_model()
-embedding_model = llm.load_model()
+#Optional headless search service (service.py); searches run locally when unset
+SEARCH_SERVICE_URL = os.environ.get("SEARCH_SERVICE_URL")
+#Render early results from the redacted input while Gemini extracts keywords
+#Off by default: it embeds and searches every query twice
+SPECULATIVE_SEARCH = os.environ.get("SPECULATIVE_SEARCH", "0") == "1"
+
+if not SEARCH_SERVICE_URL:
+    nlp = llm.load_nlp()
+    gemini = llm.gemini_model()
+    embedding_model = llm.load_model()
+
+@st.cache_resource(ttl=3600)
+def citation_graph():
+    #Shared by all sessions, reloaded hourly
+    try:
+        return load_citation_graph()
+    except Exception as e:
+        logging.error(f"Citation graph unavailable: {e}")
+        return None
+
+@st.cache_resource(ttl=3600)
+def typeahead_index():
+    #Shared by all sessions, reloaded hourly
+    try:
+        return load_typeahead_index()
+    except Exception as e:
+        logging.error(f"Typeahead index unavailable: {e}")
+        return None
+
+@st.cache_data(ttl=3600)
+def neighbours(case_id):
+    #Precomputed by search/neighbors.py, so no embedding or vector scan here
+    try:
+        return similar_cases(case_id)
+    except Exception as e:
+        logging.error(f"Similar cases unavailable for {case_id}: {e}")
+        return []
 
 #Page Configuration
 st.set_page_config(page_title="Precedent Search Tool",
                 page_icon="⚖️",
                 layout="centered")
 
+graph = citation_graph()
+typeahead = typeahead_index()
+#Local memory-mapped snapshot, if one has been built on this host
+snapshot = current_snapshot() if os.path.exists(SNAPSHOT_PATH) else None
+
 #initialise session id 
 if "session_id" not in st.session_state:
      st.session_state.session_id = str(uuid.uuid4())
 if 'results' not in st.session_state:
     st.session_state.results = []
+if 'similar_open' not in st.session_state:
+    st.session_state.similar_open = set()
 
 #Style
 st.markdown("""
@@ -52,12 +103,23 @@ st.markdown("""
 #Title
 st.markdown("<h1 style='text-align: center; font-size: 2.5em;'>Precedent Search Tool</h1>",
             unsafe_allow_html=True)
+#Known-item lookup by name or neutral citation, no embedding or Gemini call
+if typeahead is not None:
+    lookup = st.text_input("Find a case by name or citation",
+                           placeholder="E.g., Donoghue v Stevenson or [2023] EWCA Civ 123")
+    for case in typeahead.lookup(lookup):
+        st.markdown(f"- [{case['case_name']}]({case['url']}) {case['neutral_citation'] or ''} ({case['court']})")
 #User input
 user_input = st.text_input("Describe your case",
                             placeholder="E.g., fraudulent misrepresentation under contract law...")
 #Court Filter
-court_options = ["Any"] + db.get_courts()
-selected_court = st.selectbox("Filter by Court", court_options) 
+court_options = snapshot.court_names if snapshot is not None else db.get_courts()
+selected_courts = st.multiselect("Filter by Court", court_options, placeholder="Any")
+#Date Filter (needs the local snapshot)
+date_range = ()
+if snapshot is not None:
+    date_range = st.date_input("Judgment date range", value=(),
+                               min_value=datetime.date(1900, 1, 1), max_value=datetime.date.today())
 
 #Search Logic
 if(st.button("Find Precedent")):
@@ -65,49 +127,52 @@ if(st.button("Find Precedent")):
         st.warning("Please enter a case description.")
     else: 
         with st.spinner("Finding relevant precedent cases..."):
-            #Filter user input
-            redacted_input = llm.filter_input(user_input, nlp)
-            #Extract keywords
-            keywords = (llm.extract_user_keywords(redacted_input, gemini) or redacted_input).strip()
+            #Profile this search when sampled, or when the operator allows ?profile=1 and the URL has it
+            forced = profiling.ALLOW_QUERY and st.query_params.get("profile") == "1"
+            with profiling.profile("search", force=forced):
+                date_from = date_range[0] if len(date_range) > 0 else None
+                date_to = date_range[1] if len(date_range) > 1 else None
+
+                if SEARCH_SERVICE_URL:
+                    #Run the search on the headless service
+                    keywords, query_info, results, next_cursor = pipeline.run_search_remote(
+                        SEARCH_SERVICE_URL, user_input, st.session_state.session_id,
+                        selected_courts, date_from, date_to)
+                elif SPECULATIVE_SEARCH:
+                    #Show results for the redacted input while Gemini extracts keywords.
+                    #Each status update lets Streamlit stop this run if a newer query was submitted.
+                    provisional_area = st.empty()
+                    status_area = st.empty()
+                    started = time.monotonic()
+                    for stage, keywords, embedding, found, next_cursor in pipeline.speculative_search(
+                            user_input, nlp, gemini, embedding_model, selected_courts, date_from, date_to,
+                            graph=graph, snapshot=snapshot):
+                        if stage == "provisional":
+                            with provisional_area.container():
+                                for res in found:
+                                    st.markdown(f"- **{res['case_name']}** ({res['court']})")
+                        if stage in ("provisional", "waiting"):
+                            status_area.caption("Early results, refining with extracted keywords... "
+                                                f"{time.monotonic() - started:.1f}s")
+                    provisional_area.empty()
+                    status_area.empty()
+
+                    query_info = pipeline.build_query_info(st.session_state.session_id, user_input, keywords, embedding)
+                    results = pipeline.build_result_rows(found, query_info["query_id"])
+                    #log the search data into database
+                    log_search_transaction(query_info, results)
+                else:
+                    #Redact, extract keywords, embed, search and log the search data into database
+                    keywords, query_info, results, next_cursor = pipeline.run_search(
+                        user_input, st.session_state.session_id, nlp, gemini, embedding_model,
+                        selected_courts, date_from, date_to, graph=graph, snapshot=snapshot)
+
             st.session_state.keywords = keywords  # Save to session_state
-            #embed input
-            embedding = llm.generate_embeddings(keywords, embedding_model)
-            embedding = embedding / np.linalg.norm(embedding)
-            embedded_keywords = ','.join(map(str, embedding.tolist()))
-
-            #Fetch the top matching cases
-            results = db.fetch_cases(embedded_keywords, selected_court)
-            query_id = str(uuid.uuid4())
-
-            #Store Query info
-            query_info = {
-                "session_id": st.session_state.session_id,
-                "query_text": user_input,
-                "extracted_keywords": {"keywords": keywords},
-                "query_embedding": embedding.tolist(),
-                "query_id": query_id,
-            }
             st.session_state.query_info = query_info  # Save in session for later use
-
             #Store results in session state
-            st.session_state.results = [
-                {
-                    "case_id": res["case_id"],
-                    "name": res["case_name"],
-                    "court": res["court"],
-                    "url": res["url"],
-                    "summary": res["summary"],
-                    "similarity_score": res["similarity_score"],
-                    "query_id": query_id,
-                    "rank": i + 1,
-                    "feedback_score": None,
-                    "query_result_id": str(uuid.uuid4())
-                }
-                for i, res in enumerate(results)
-            ]
-
-            #log the search data into database
-            log_search_transaction(query_info, st.session_state.results)
+            st.session_state.results = results
+            #Position after the last result, for "Load more results"
+            st.session_state.next_cursor = next_cursor
 
             
 #Display Keywords
@@ -127,6 +192,23 @@ if "results" in st.session_state and st.session_state.results:
             st.markdown(f"**Similarity:** {confidence:.2f}% | [View Case]({result['url']})")
             st.markdown(f"**Summary:** {result['summary']}")
 
+            #Display related precedents from the citation graph
+            related = graph.related(result['case_id']) if graph is not None else []
+            if related:
+                with st.expander(f"Related precedents (cited {graph.cited_by_count(result['case_id'])} times)"):
+                    for case_id, _ in related:
+                        st.markdown(f"- [{graph.names.get(case_id, case_id)}]({graph.urls.get(case_id, '#')})")
+
+            #Display the nearest cases to this one
+            if st.button("Similar cases", key=f"similar_{result['query_result_id']}"):
+                st.session_state.similar_open ^= {result['case_id']}
+            if result['case_id'] in st.session_state.similar_open:
+                similar = neighbours(result['case_id'])
+                if not similar:
+                    st.caption("No similar cases computed for this case yet.")
+                for case in similar:
+                    st.markdown(f"- [{case['case_name']}]({case['url']}) ({case['court']})")
+
             #Display for user feedback on cases
             st.write("**Rate this result's relevance:**")
             cols = st.columns(5)
@@ -144,4 +226,16 @@ if "results" in st.session_state and st.session_state.results:
                             st.toast(f"Thanks! You rated '{result['name']}' as {score_value} ⭐.")
                         else:
                             st.error("Could not save feedback.")
-              
\ No newline at end of file
+
+    #Next page continues from the stored cursor, reusing the query's embedding
+    if st.session_state.get("next_cursor") and st.button("Load more results"):
+        with st.spinner("Loading more cases..."):
+            if SEARCH_SERVICE_URL:
+                more, next_cursor = pipeline.search_page_remote(
+                    SEARCH_SERVICE_URL, st.session_state.query_info, st.session_state.next_cursor)
+            else:
+                more, next_cursor = pipeline.search_page(
+                    st.session_state.query_info, st.session_state.next_cursor, graph=graph, snapshot=snapshot)
+        st.session_state.results = st.session_state.results + more
+        st.session_state.next_cursor = next_cursor
+        st.rerun()
@@ -1,9 +1,13 @@
 from utils import api
+from utils.rate_limit import RateBudget
 from db import citation_op as CT
-from db.connection import conn 
+from db.connection import conn
 import db.check as db
-import time
-import json
+import db.fingerprints as FP
+from utils import fingerprint
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import utils.genai as llm
 import logging
 
@@ -17,58 +21,151 @@ gemini = llm.gemini_model()
 gemini1 = llm.gemini_model1()
 embed_model = llm.load_model()
 
-def bakfill_missing_metadata(): 
-    missing = CT.get_priority_missing_cases()
-    
+# Shared request budgets. The two Gemini models run on separate API keys,
+# so each key gets its own bucket.
+WORKERS = int(os.environ.get("BACKFILL_WORKERS", 4))
+BATCH_SIZE = int(os.environ.get("BACKFILL_BATCH_SIZE", 20))
+summary_budget = RateBudget(int(os.environ.get("GEMINI_SUMMARY_RPM", 10)))
+keyword_budget = RateBudget(int(os.environ.get("GEMINI_KEYWORD_RPM", 10)))
+archive_budget = RateBudget(int(os.environ.get("ARCHIVE_RPM", 120)), burst=WORKERS)
+
+in_flight = set()
+in_flight_lock = threading.Lock()
+
+def claim(xml_link):
+    """
+    Reserve a case url so no two workers process the same judgment
+    """
+    with in_flight_lock:
+        if xml_link in in_flight:
+            return False
+        in_flight.add(xml_link)
+        return True
+
+def enrich_case(citation, xml_link):
+    """
+    Worker: download one judgment and run the LLM and embedding stages.
+    Returns everything the main thread needs to insert it, or None.
+    """
+    archive_budget.acquire()
+    judgement_root = api.fetch_judgment(xml_link)
+    case_id, title, date, court = api.extract_case_from_xml(judgement_root, xml_link)
+    neutral_citation = api.get_nuetral_citation(judgement_root) or citation
+    #The feed may already have stored this judgment, possibly under its tna:uri id
+    if db.check_database(case_id) or db.find_stored_case_id(xml_link, neutral_citation):
+        logger.info(f"{citation} is already stored, skipping.")
+        return None
+    case_content = api.parse_case_content(judgement_root)
+    if not case_content:
+        logger.error(f"Could not fetch content from {xml_link}")
+        return None
+
+    #Get case summary
+    summary_budget.acquire()
+    summary = llm.produce_summary(case_content, gemini1)
+    if not summary:
+        logger.error(f"Summary generation failed for {citation}")
+        return None
+
+    keyword_budget.acquire()
+    keywords = llm.extract_keywords(case_content, gemini)
+    if not keywords:
+        logger.error(f"Keyword extraction failed for {citation}")
+        return None
+
+    return {
+        "case_id": case_id,
+        "title": title,
+        "date": date,
+        "court": court,
+        "xml_link": xml_link,
+        "keywords": keywords,
+        "summary": summary,
+        "neutral_citation": neutral_citation,
+        "cited_cases": api.get_cited_cases(judgement_root, judgement_root),
+        "content_hash": fingerprint.content_hash(case_content),
+        "minhash": fingerprint.minhash(case_content),
+    }
+
+def store_case(case):
+    """
+    Main thread: embed and insert a backfilled case with its own citations
+    """
+    embedded_keywords = llm.generate_embeddings(case["keywords"], embed_model)
+    db.insert_database(conn, case["case_id"], case["title"], case["date"], case["court"],
+                       case["xml_link"], case["keywords"], embedded_keywords, case["summary"])
+
+    cur = conn.cursor()
+    try:
+        CT.update_neutral_citation(cur, case["case_id"], case["neutral_citation"])
+        if case["cited_cases"]:
+            CT.insert_citations(cur, case["case_id"], case["cited_cases"])
+        CT.mark_citations_extracted(cur, case["case_id"])
+        FP.store_fingerprint(cur, case["case_id"], case["content_hash"], case["minhash"])
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Failed to store citations for {case['case_id']}: {e}")
+        conn.rollback()
+    finally:
+        cur.close()
+
+def backfill_missing_metadata(limit=100, workers=WORKERS, batch_size=BATCH_SIZE):
+    """
+    Backfill the most-cited cases missing from the database, in priority order,
+    with concurrent workers under the shared rate budgets
+    """
+    CT.ensure_citation_counts_table()
+    FP.ensure_fingerprint_tables()
+    db.ensure_case_lookup_indexes()
+    # Link anything that became resolvable since the last run, so the priority
+    # list only holds cases that are truly missing
+    logger.info(f"Re-linked {CT.relink_citations()} citations before backfill.")
+
+    missing = CT.get_priority_missing_cases(limit)
     if not missing:
         logger.warning("No missing cases retrieved from the database.")
         return
 
-    logger.info(f"Starting processing for {len(missing)} cases.")
+    logger.info(f"Starting processing for {len(missing)} cases with {workers} workers.")
+    inserted = 0
 
-    for citation, occ in missing: 
-        # Handle the 'None' citation before it hits the API function
-        if citation is None:
-            logger.error("Skipping a record: Citation is None (NULL in database).")
-            continue
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            futures = {}
 
-        try: 
-            xml_link = api.build_case_url(citation)
-            
-            if not xml_link:
-                    logging.warning(f"Could not construct URL for {citation}")
+            for citation, refs in batch:
+                # Handle the 'None' citation before it hits the API function
+                if citation is None:
+                    logger.error("Skipping a record: Citation is None (NULL in database).")
+                    continue
+                xml_link = api.build_case_url(citation)
+                if xml_link == "No Citation Found":
+                    logger.warning(f"Could not construct URL for {citation}")
+                    continue
+                if not claim(xml_link):
                     continue
-            #get case content
-            case_content = api.cases_content(xml_link )
-            if not case_content:
-                logging.error(f"Could not fetch content from {xml_link}")
-                continue
-                #Get case summary
-            summary = llm.produce_summary(case_content, gemini1)
-            time.sleep(30) # Respect rate limits
-            
-            if summary:
-                keywords = llm.extract_keywords(case_content, gemini)
-                embedded_keywords = llm.generate_embeddings(keywords, embed_model)
-
-                db.insert_database(
-                    conn, 
-                    citation, 
-                    xml_link, 
-                    keywords, 
-                    embedded_keywords, 
-                    summary
-                )
-                logging.info(f"Successfully backfilled {citation}")
-                time.sleep(30)
-            else:
-                logging.error(f"Summary generation failed for {citation}")
-
-        except Exception as e:
-            logging.error(f"Error during backfill of {citation}: {e}")
-            continue
-
-    logger.info("Batch processing complete.")
+                futures[pool.submit(enrich_case, citation, xml_link)] = (citation, xml_link)
+
+            resolved = []
+            for future in as_completed(futures):
+                citation, xml_link = futures[future]
+                try:
+                    case = future.result()
+                    if case is None:
+                        continue
+                    store_case(case)
+                    resolved += [citation, case["neutral_citation"]]
+                    inserted += 1
+                    logger.info(f"Successfully backfilled {citation}")
+                except Exception as e:
+                    logger.error(f"Error during backfill of {citation}: {e}")
+                    conn.rollback()
+
+            if resolved:
+                logger.info(f"Batch done: re-linked {CT.relink_citations(resolved)} citations.")
+
+    logger.info(f"Backfill complete: {inserted} of {len(missing)} cases inserted.")
 
 if __name__ == "__main__":
-    bakfill_missing_metadata()
+    backfill_missing_metadata()
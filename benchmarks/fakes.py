@@ -0,0 +1,270 @@
+"""
+Local stand-ins for Gemini, the Supabase RPCs and Postgres with configurable
+latency, so benchmarks never touch an external service.
+
+install_fakes() must run before anything imports db.connection or
+db.users_connection, which connect on import.
+"""
+import sys
+import time
+import types
+import random
+import threading
+import numpy as np
+
+DIM = 384
+COURTS = ["Court of Appeal (Civil Division)", "High Court (Chancery Division)", "Supreme Court",
+          "First-tier Tribunal (Tax)", "Upper Tribunal (Immigration and Asylum Chamber)"]
+
+
+def _sleep(latency, jitter):
+    """
+    Sleep for `latency` seconds +/- `jitter` (uniform)
+    """
+    if latency > 0:
+        time.sleep(max(0.0, random.uniform(latency - jitter, latency + jitter)))
+
+
+class FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGemini:
+    """
+    GenerativeModel stand-in: sleeps, then returns canned keywords
+    """
+
+    def __init__(self, latency=1.5, jitter=0.5, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def generate_content(self, prompt):
+        _sleep(self.latency, self.jitter)
+        if random.random() < self.error_rate:
+            raise RuntimeError("fake Gemini error")
+        if "python dictionary" in prompt:
+            # Case keyword extraction expects a dict it can json.loads
+            return FakeGeminiResponse(
+                '```python\n{"Legal Concepts": ["breach of contract"], '
+                '"Notice or Penalty Types and Actions": ["damages"], '
+                '"Factual Circumstances and Arguments": ["late delivery"]}\n```'
+            )
+        return FakeGeminiResponse(
+            "1) Legal Concepts:\n* breach of contract\n* misrepresentation\n"
+            "2) Notice or Penalty Types and Actions:\n* rescission\n* damages\n"
+            "3) Factual Circumstances and Arguments:\n* " + prompt[-80:].strip().replace("\n", " ")
+        )
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Call:
+    def __init__(self, run):
+        self.run = run
+
+    def execute(self):
+        return _Result(self.run())
+
+
+class FakeSupabase:
+    """
+    Supabase client stand-in answering match_cases, match_case_ids and
+    distinct_courts from a random in-memory corpus, after a configurable
+    network latency
+    """
+
+    def __init__(self, cases=5000, latency=0.15, jitter=0.05, error_rate=0.0, seed=0):
+        rng = np.random.default_rng(seed)
+        vectors = rng.standard_normal((cases, DIM)).astype(np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.courts = [COURTS[i % len(COURTS)] for i in range(cases)]
+        self.court_array = np.array(self.courts)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def _row(self, i, distance):
+        return {
+            "case_id": f"fake-{i}",
+            "case_name": f"Fake Case {i}",
+            "court": self.courts[i],
+            "url": f"https://example.invalid/fake/{i}",
+            "summary": "A fake summary used for load testing. " * 4,
+            "distance": float(distance),
+        }
+
+    def _match_cases(self, params):
+        query = np.asarray(params["query_embedding"], dtype=np.float32)
+        rows = np.arange(len(self.vectors))
+        if params.get("court_filter", "Any") != "Any":
+            rows = rows[self.court_array == params["court_filter"]]
+        distances = 1.0 - self.vectors[rows] @ query
+        k = min(params.get("match_count", 10), len(rows))
+        top = np.argpartition(distances, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(distances[top])]
+        return [self._row(int(rows[i]), distances[i]) for i in top]
+
+    def _match_case_ids(self, params):
+        query = np.asarray(params["query_embedding"], dtype=np.float32)
+        rows = np.arange(len(self.vectors))
+        if params.get("court_filter", "Any") != "Any":
+            rows = rows[self.court_array == params["court_filter"]]
+        distances = (1.0 - self.vectors[rows] @ query).astype(np.float64)
+        if params.get("after_distance") is not None:
+            after = (params["after_distance"], params["after_case_id"])
+            keep = np.array([(distances[j], f"fake-{i}") > after for j, i in enumerate(rows)], dtype=bool)
+            rows, distances = rows[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return [{"case_id": f"fake-{rows[j]}", "distance": float(distances[j]), "duplicate_of": None}
+                for j in order[:params.get("match_count", 10)]]
+
+    def rpc(self, name, params=None):
+        def run():
+            _sleep(self.latency, self.jitter)
+            if random.random() < self.error_rate:
+                raise RuntimeError(f"fake {name} RPC error")
+            if name == "match_cases":
+                return self._match_cases(params)
+            if name == "match_case_ids":
+                return self._match_case_ids(params)
+            if name == "distinct_courts":
+                return list(COURTS)
+            raise ValueError(f"fake Supabase has no RPC {name}")
+        return _Call(run)
+
+    def table(self, name):
+        return _FakeTable(self, name)
+
+
+class _FakeTable:
+    """
+    Just enough of the Supabase query builder for table(...).select(...).in_(...)
+    """
+
+    def __init__(self, supabase, name):
+        self.supabase = supabase
+        self.name = name
+        self.columns = []
+
+    def select(self, columns):
+        self.columns = [c.strip() for c in columns.split(",")]
+        return self
+
+    def in_(self, column, values):
+        def run():
+            _sleep(self.supabase.latency, self.supabase.jitter)
+            rows = []
+            for value in values:
+                row = dict(self.supabase._row(int(value.rsplit("-", 1)[1]), 0.0), duplicate_of=None)
+                rows.append({c: row[c] for c in self.columns if c in row})
+            return rows
+        return _Call(run)
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, query, params=None):
+        # A psycopg2 connection serves one statement at a time
+        with self.connection.lock:
+            _sleep(self.connection.latency, self.connection.jitter)
+            self.connection.statements += 1
+        if random.random() < self.connection.error_rate:
+            raise RuntimeError("fake Postgres error")
+        self.rowcount = 1
+
+    def fetchone(self):
+        return (0,)
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """
+    psycopg2 connection stand-in: statements serialise on one lock, like a
+    single shared connection does
+    """
+
+    def __init__(self, latency=0.01, jitter=0.005, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.statements = 0
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        with self.lock:
+            _sleep(self.latency, self.jitter)
+
+    def rollback(self):
+        pass
+
+
+class FakeNLP:
+    """
+    spaCy stand-in with no entities
+    """
+
+    def __call__(self, text):
+        return types.SimpleNamespace(ents=[])
+
+    def pipe(self, texts, batch_size=64):
+        return (self(text) for text in texts)
+
+
+class FakeEncoder:
+    """
+    Embedding model stand-in: deterministic pseudo-random unit vectors
+    """
+
+    def __init__(self, latency=0.005):
+        self.latency = latency
+
+    def encode(self, sentences, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        _sleep(self.latency, 0)
+        out = np.stack([np.random.default_rng(abs(hash(t)) % 2**32).standard_normal(DIM) for t in texts])
+        out = (out / np.linalg.norm(out, axis=1, keepdims=True)).astype(np.float32)
+        return out[0] if single else out
+
+
+def install_fakes(supabase, connection):
+    """
+    Register fake db.connection and db.users_connection modules so the real
+    db package code runs against local stand-ins
+    """
+    if "db.connection" in sys.modules and not getattr(sys.modules["db.connection"], "FAKE", False):
+        raise RuntimeError("db.connection was imported before install_fakes(); it may have connected")
+
+    connection_module = types.ModuleType("db.connection")
+    connection_module.conn = connection
+    connection_module.DATABASE_URL = "postgresql://fake"
+    connection_module.FAKE = True
+
+    users_module = types.ModuleType("db.users_connection")
+    users_module.anon_supabase = supabase
+    users_module.FAKE = True
+
+    sys.modules["db.connection"] = connection_module
+    sys.modules["db.users_connection"] = users_module
@@ -0,0 +1,291 @@
+"""
+Offline ingestion benchmark over recorded Atom pages and judgment XML.
+
+A corpus directory holds the files plus a manifest.json mapping each
+recorded URL to its file:
+
+    {"pages": {"<atom url>": "page-001.xml", ...},
+     "judgments": {"<data.xml url>": "judgments/0001.xml", ...}}
+
+requests.get is served from that manifest, and Gemini, the encoder and the
+database are stubbed, so a run never touches the network. The benchmark
+replays fetch_page entry handling, then runs every judgment through the
+legacy parser path (ElementTree + lxml parse, per-citation XPath) and the
+single-parse path, checking that both produce the same output.
+
+    python -m benchmarks.ingest_benchmark --record corpus --pages 2    # one-off, uses the network
+    python -m benchmarks.ingest_benchmark --corpus corpus --repeat 3
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from lxml import etree
+import utils.api as api
+
+FEED_URL = "https://caselaw.nationalarchives.gov.uk/atom.xml"
+
+
+class CpuTimer:
+    """
+    Accumulates CPU time and call counts per function name
+    """
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def wrap(self, name, fn):
+        def timed(*args, **kwargs):
+            start = time.process_time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.seconds[name] += time.process_time() - start
+                self.calls[name] += 1
+        return timed
+
+
+def load_manifest(corpus):
+    with open(os.path.join(corpus, "manifest.json")) as f:
+        manifest = json.load(f)
+    files = {}
+    for section in ("pages", "judgments"):
+        for url, path in manifest.get(section, {}).items():
+            files[url] = os.path.join(corpus, path)
+    return manifest, files
+
+
+class ReplayResponse:
+    """
+    The parts of requests.Response the parsers use
+    """
+
+    def __init__(self, url, status_code, content=b""):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.text = content.decode("utf-8")
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise IOError(f"{self.status_code} for {self.url} (not in the recorded corpus)")
+
+
+def replay_requests(files):
+    """
+    Stand-in for requests.get that serves recorded files; unknown URLs get a 404
+    """
+    cache = {}
+
+    def get(url, *args, **kwargs):
+        if url not in files:
+            return ReplayResponse(url, 404)
+        if url not in cache:
+            with open(files[url], "rb") as f:
+                cache[url] = f.read()
+        return ReplayResponse(url, 200, cache[url])
+    return get
+
+
+def legacy_parse(xml_link):
+    """
+    Parser path before the single-parse rewrite: three downloads/parses
+    and one whole-document XPath per citation
+    """
+    et_root, lxml_root = api.extract_from_xml(xml_link)
+    return {
+        "neutral_citation": api.get_nuetral_citation(et_root),
+        "cited_cases": api.get_cited_cases(et_root, lxml_root),
+        "content": api.case_content(xml_link),
+    }
+
+
+def single_parse(xml_link):
+    """
+    Current parser path: one download and one lxml tree for everything
+    """
+    judgement_root = api.fetch_judgment(xml_link)
+    return {
+        "neutral_citation": api.get_nuetral_citation(judgement_root),
+        "cited_cases": api.collect_cited_cases(judgement_root),
+        "content": api.parse_case_content(judgement_root),
+    }
+
+
+def replay_feed(timer):
+    """
+    Run fetch_page entry handling over the recorded pages
+    """
+    entries = []
+    for entry in timer.wrap("fetch_page", lambda: list(api.fetch_page(delay=0)))():
+        case_id = timer.wrap("get_caseid", api.get_caseid)(entry)
+        title, date, court, xml_link = timer.wrap("extract_case", api.extract_case)(entry)
+        entries.append((case_id, xml_link))
+    return entries
+
+
+def run_path(name, parse, links, repeat, timer, stub_enrichment):
+    """
+    Parse every judgment `repeat` times and report throughput, then take the
+    memory peak over one separate repeat
+    """
+    from benchmarks.fakes import FakeEncoder, FakeGemini
+    import utils.genai as llm
+    gemini, encoder = FakeGemini(latency=0), FakeEncoder(latency=0)
+
+    def run(parse, wrap, repeat):
+        outputs, citations = {}, 0
+        for _ in range(repeat):
+            for link in links:
+                result = parse(link)
+                outputs[link] = result
+                citations += len(result["cited_cases"])
+                if stub_enrichment:
+                    # Prompt building and embedding with the LLM and encoder stubbed
+                    wrap(f"{name}.produce_summary", llm.produce_summary)(result["content"], gemini)
+                    keywords = wrap(f"{name}.extract_keywords", llm.extract_keywords)(result["content"], gemini)
+                    wrap(f"{name}.generate_embeddings", llm.generate_embeddings)(keywords or "", encoder)
+        return outputs, citations
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    outputs, citations = run(timer.wrap(f"{name}.parse", parse), timer.wrap, repeat)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    # tracemalloc slows every allocation, so the peak comes from one more, untimed repeat
+    tracemalloc.start()
+    run(parse, lambda _, fn: fn, 1)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    docs = len(links) * repeat
+    return outputs, {
+        "path": name,
+        "documents": docs,
+        "docs_per_sec": docs / wall if wall else float("inf"),
+        "citations_per_sec": citations / wall if wall else float("inf"),
+        "cpu_seconds": cpu,
+        "python_peak_mb": peak / 1e6,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def compare_outputs(legacy, current):
+    """
+    Links whose parsed output differs between the two paths
+    """
+    return [link for link in legacy if legacy[link] != current.get(link)]
+
+
+def record_corpus(out_dir, pages, per_page):
+    """
+    Save Atom pages and judgment XML from the live feed as a replayable corpus
+    """
+    import requests
+
+    os.makedirs(os.path.join(out_dir, "judgments"), exist_ok=True)
+    manifest = {"pages": {}, "judgments": {}}
+    url = FEED_URL
+    for page in range(1, pages + 1):
+        if not url:
+            break
+        response = requests.get(url)
+        response.raise_for_status()
+        page_file = f"page-{page:03d}.xml"
+        with open(os.path.join(out_dir, page_file), "wb") as f:
+            f.write(response.content)
+        manifest["pages"][url] = page_file
+
+        root = etree.fromstring(response.content)
+        for entry in root.findall("atom:entry", api.namespaces)[:per_page]:
+            xml_link = api.extract_case(entry)[3]
+            if not xml_link or xml_link in manifest["judgments"]:
+                continue
+            judgment_file = f"judgments/{len(manifest['judgments']) + 1:04d}.xml"
+            with open(os.path.join(out_dir, judgment_file), "wb") as f:
+                f.write(requests.get(xml_link).content)
+            manifest["judgments"][xml_link] = judgment_file
+            time.sleep(0.5)
+
+        next_link = root.find(".//atom:link[@rel='next']", api.namespaces)
+        url = next_link.get("href") if next_link is not None else None
+
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Recorded {len(manifest['pages'])} pages and {len(manifest['judgments'])} judgments to {out_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="directory with manifest.json and recorded XML")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the corpus per path")
+    parser.add_argument("--stub-enrichment", action="store_true",
+                        help="also time prompt building and embedding with stubbed Gemini/encoder")
+    parser.add_argument("--record", metavar="DIR", help="record a corpus from the live feed instead")
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--per-page", type=int, default=20)
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="fail if docs/sec fell more than --tolerance below this report")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.record:
+        record_corpus(args.record, args.pages, args.per_page)
+        return
+    if not args.corpus:
+        parser.error("--corpus is required unless --record is given")
+
+    manifest, files = load_manifest(args.corpus)
+    api.requests.get = replay_requests(files)  # no network from here on
+    timer = CpuTimer()
+
+    entries = replay_feed(timer) if manifest.get("pages") else []
+    links = list(manifest["judgments"])
+
+    legacy_out, legacy = run_path("legacy", legacy_parse, links, args.repeat, timer, args.stub_enrichment)
+    current_out, current = run_path("single_parse", single_parse, links, args.repeat, timer, args.stub_enrichment)
+    mismatches = compare_outputs(legacy_out, current_out)
+
+    report = {
+        "feed_entries": len(entries),
+        "judgments": len(links),
+        "paths": [legacy, current],
+        "speedup": current["docs_per_sec"] / legacy["docs_per_sec"] if legacy["docs_per_sec"] else None,
+        "cpu_seconds_by_function": {name: round(sec, 4) for name, sec in sorted(timer.seconds.items())},
+        "calls_by_function": dict(timer.calls),
+        "mismatches": mismatches,
+    }
+
+    print(f"{len(entries)} feed entries, {len(links)} judgments x {args.repeat}")
+    for path in report["paths"]:
+        print(f"{path['path']:>13}: {path['docs_per_sec']:8.1f} docs/s  {path['citations_per_sec']:9.1f} citations/s  "
+              f"cpu {path['cpu_seconds']:.2f}s  py peak {path['python_peak_mb']:.1f} MB  RSS {path['max_rss_mb']:.0f} MB")
+    print(f"speedup: {report['speedup']:.2f}x")
+    for name, seconds in sorted(timer.seconds.items(), key=lambda item: -item[1]):
+        print(f"  {name:<35} {seconds * 1000:10.1f} ms cpu  {timer.calls[name]:6d} calls")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    if mismatches:
+        print(f"PARSER REGRESSION: {len(mismatches)} judgments parse differently, e.g. {mismatches[0]}")
+        failed = True
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        before = baseline["paths"][-1]["docs_per_sec"]
+        if current["docs_per_sec"] < before * (1 - args.tolerance):
+            print(f"PERFORMANCE REGRESSION: {current['docs_per_sec']:.1f} docs/s vs baseline {before:.1f}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Concurrent-user load test for the search and feedback path.
+
+Drives search.pipeline.run_search plus a feedback update with N concurrent
+virtual sessions (threads, as Streamlit runs one script thread per session).
+Gemini, the Supabase RPCs, Postgres, spaCy and the encoder are replaced by
+local fakes with configurable latency, so nothing external is contacted.
+--real-models uses the real spaCy pipeline and encoder instead; they must
+already be installed and cached, as the Hugging Face hub is not contacted.
+
+    python -m benchmarks.load_test --concurrency 1,4,16,64 --duration 20
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import threading
+import time
+import tracemalloc
+import uuid
+import numpy as np
+from benchmarks.fakes import (FakeConnection, FakeEncoder, FakeGemini, FakeNLP,
+                              FakeSupabase, install_fakes)
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else float("nan")
+
+
+def run_level(concurrency, duration, models, think_time, feedback_rate):
+    """
+    Run `concurrency` virtual sessions for `duration` seconds and
+    return throughput, latency percentiles and error counts
+    """
+    import search.pipeline as pipeline
+    from db.fill_query import update_feedback_score
+
+    nlp, gemini, embedding_model = models
+    latencies = {"search": [], "feedback": []}
+    errors = {"search": 0, "feedback": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def session():
+        session_id = str(uuid.uuid4())
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                _, _, results, _ = pipeline.run_search(
+                    "The landlord failed to return the tenancy deposit and the tenant claims a penalty",
+                    session_id, nlp, gemini, embedding_model)
+                with lock:
+                    latencies["search"].append(time.perf_counter() - start)
+            except Exception:
+                with lock:
+                    errors["search"] += 1
+                continue
+
+            if results and random.random() < feedback_rate:
+                start = time.perf_counter()
+                ok = update_feedback_score(random.choice(results)["query_result_id"], random.randint(1, 5))
+                with lock:
+                    if ok:
+                        latencies["feedback"].append(time.perf_counter() - start)
+                    else:
+                        errors["feedback"] += 1
+            if think_time:
+                time.sleep(random.expovariate(1 / think_time))
+
+    threads = [threading.Thread(target=session, daemon=True) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    searches = len(latencies["search"])
+    attempts = searches + errors["search"]
+    return {
+        "concurrency": concurrency,
+        "searches": searches,
+        "throughput_rps": searches / elapsed,
+        "search_p50_ms": percentile(latencies["search"], 50),
+        "search_p95_ms": percentile(latencies["search"], 95),
+        "search_p99_ms": percentile(latencies["search"], 99),
+        "feedback_p95_ms": percentile(latencies["feedback"], 95),
+        "error_rate": errors["search"] / attempts if attempts else 0.0,
+        "feedback_errors": errors["feedback"],
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def memory_peak(concurrency, duration, models, think_time, feedback_rate):
+    """
+    Peak traced Python memory (MB) over a separate, untimed run; tracemalloc
+    slows every allocation, so it stays out of the timed runs
+    """
+    tracemalloc.start()
+    try:
+        run_level(concurrency, duration, models, think_time, feedback_rate)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="comma-separated session counts")
+    parser.add_argument("--duration", type=float, default=15, help="seconds per concurrency level")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between a session's searches")
+    parser.add_argument("--feedback-rate", type=float, default=0.5, help="share of searches followed by a rating")
+    parser.add_argument("--gemini-latency", type=float, default=1.5)
+    parser.add_argument("--rpc-latency", type=float, default=0.15)
+    parser.add_argument("--db-latency", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="injected failure rate for every fake")
+    parser.add_argument("--cases", type=int, default=5000, help="size of the fake match_cases corpus")
+    parser.add_argument("--real-models", action="store_true",
+                        help="use the cached spaCy pipeline and encoder instead of fakes")
+    parser.add_argument("--memory-duration", type=float, default=3,
+                        help="seconds of the separate tracemalloc run per level (0 skips it)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    install_fakes(
+        FakeSupabase(cases=args.cases, latency=args.rpc_latency, jitter=args.rpc_latency / 3,
+                     error_rate=args.error_rate),
+        FakeConnection(latency=args.db_latency, jitter=args.db_latency / 2, error_rate=args.error_rate),
+    )
+    gemini = FakeGemini(latency=args.gemini_latency, jitter=args.gemini_latency / 3, error_rate=args.error_rate)
+    if args.real_models:
+        #Never download a model in the middle of a benchmark
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        import utils.genai as llm
+        try:
+            nlp, embedding_model = llm.load_nlp(), llm.load_model()
+        except Exception as e:
+            parser.error(f"--real-models needs spaCy and the encoder installed and cached locally: {e}")
+    else:
+        nlp, embedding_model = FakeNLP(), FakeEncoder()
+
+    header = f"{'users':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'py peak MB':>11} {'RSS MB':>8}"
+    if not args.json:
+        print(header)
+    for level in [int(c) for c in args.concurrency.split(",")]:
+        models = (nlp, gemini, embedding_model)
+        report = run_level(level, args.duration, models, args.think_time, args.feedback_rate)
+        report["python_peak_mb"] = (memory_peak(level, args.memory_duration, models, args.think_time,
+                                                args.feedback_rate) if args.memory_duration else float("nan"))
+        if args.json:
+            print(json.dumps(report))
+        else:
+            print(f"{report['concurrency']:>6} {report['throughput_rps']:>8.2f} {report['search_p50_ms']:>9.0f} "
+                  f"{report['search_p95_ms']:>9.0f} {report['search_p99_ms']:>9.0f} {report['error_rate']:>7.1%} "
+                  f"{report['python_peak_mb']:>11.1f} {report['max_rss_mb']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
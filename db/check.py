@@ -21,6 +21,48 @@ def check_database(case_id):
     return exists
 
 
+def ensure_case_lookup_indexes():
+    """
+    Index the columns find_stored_case_id looks judgments up by
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        CREATE INDEX IF NOT EXISTS cases_url_idx ON cases (url);
+        CREATE INDEX IF NOT EXISTS cases_neutral_citation_idx ON cases (neutral_citation);
+        """)
+    conn.commit()
+
+
+def find_stored_case_id(xml_link, neutral_citation=None):
+    """
+    Id of a stored case with the same xml url or neutral citation, or None.
+    The feed keys judgments by tna:uri while the backfill keys them by their
+    FRBR path, so the same judgment can arrive under two different ids.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        SELECT case_id FROM cases
+        WHERE url = %s OR (%s IS NOT NULL AND neutral_citation = %s)
+        LIMIT 1;
+        """, (xml_link, neutral_citation, neutral_citation))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def resolve_case_id(case_id, xml_link, neutral_citation=None):
+    """
+    The id a judgment is stored under: `case_id` itself if it is stored or
+    new, otherwise the id it was backfilled under
+    """
+    if check_database(case_id):
+        return case_id
+    stored = find_stored_case_id(xml_link, neutral_citation) if xml_link else None
+    if stored is not None:
+        logging.info(f"{case_id} is stored as {stored}")
+        return stored
+    return case_id
+
+
 def get_courts():
     """
     Fetch all distinct court names from the 'cases' table.
@@ -28,34 +70,142 @@ def get_courts():
     response = anon_supabase.rpc("distinct_courts").execute()
     return sorted(response.data)
 
-def fetch_cases(embedding, court = "Any", limit = 10):
+def fetch_cases(embedding, court = "Any", limit = 10, graph = None):
         """
-        Find similar cases using cosine distance between database keywords and input keywords
+        Find similar cases using cosine distance between database keywords and input keywords.
+        `court` may be a single court name or a list of courts (empty or "Any" means all).
+        If a citation graph is given, results are re-ranked towards well-cited authorities.
         """
         if isinstance(embedding, str):
             embedding = [float(x) for x in embedding.split(",")] 
 
-        #Function match_cases exists in supabase 
-        response = anon_supabase.rpc(
-            "match_cases",
-            {
-                "query_embedding": embedding,
-                "court_filter": court,
-                "match_count": limit,
-            },
-        ).execute()
+        if isinstance(court, str):
+            courts = [court]
+        else:
+            courts = list(court) or ["Any"]
+        if "Any" in courts:
+            courts = ["Any"]
 
         results = []
+        for court_filter in courts:
+            #Function match_cases exists in supabase 
+            response = anon_supabase.rpc(
+                "match_cases",
+                {
+                    "query_embedding": embedding,
+                    "court_filter": court_filter,
+                    "match_count": limit,
+                },
+            ).execute()
+
+            for row in response.data or []:
+                results.append({
+                    "case_id": row.get("case_id"),
+                    "case_name": row.get("case_name", "Unknown"),
+                    "court": row.get("court", "Unknown"),
+                    "url": row.get("url", "#"),
+                    "summary": row.get("summary", "No summary available."),
+                    "similarity_score": row.get("distance", 1.0),  # use distance from your SQL
+                })
+
+        if len(courts) > 1:
+            #Merge the per-court result lists
+            results = sorted(results, key=lambda r: float(r["similarity_score"]))[:limit]
+        if graph is not None:
+            from search.graph import rerank
+            results = rerank(results, graph)
+        return results
+
+def ensure_search_functions():
+    """
+    Create (or replace) the match_case_ids RPC: ids and distances only,
+    resuming after a (distance, case_id) key and ordered by distance alone
+    so the pgvector index serves every page
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        DROP FUNCTION IF EXISTS match_case_ids(vector, TEXT, INT);
+        CREATE OR REPLACE FUNCTION match_case_ids(
+            query_embedding vector,
+            court_filter TEXT DEFAULT 'Any',
+            match_count INT DEFAULT 10,
+            after_distance DOUBLE PRECISION DEFAULT NULL,
+            after_case_id TEXT DEFAULT NULL
+        )
+        RETURNS TABLE (case_id TEXT, distance DOUBLE PRECISION, duplicate_of TEXT)
+        LANGUAGE plpgsql STABLE
+        AS $$
+        BEGIN
+            -- Keep an HNSW scan going past candidates the filters reject (pgvector 0.8+)
+            BEGIN
+                PERFORM set_config('hnsw.iterative_scan', 'strict_order', true);
+            EXCEPTION WHEN others THEN
+                NULL;
+            END;
+            PERFORM set_config('hnsw.ef_search', LEAST(GREATEST(match_count, 40), 1000)::TEXT, true);
+            RETURN QUERY
+            SELECT c.case_id, c.keyword_vectors <=> query_embedding, c.duplicate_of
+            FROM cases c
+            WHERE c.keyword_vectors IS NOT NULL
+              AND (court_filter = 'Any' OR c.court = court_filter)
+              AND (after_distance IS NULL
+                   OR (c.keyword_vectors <=> query_embedding, c.case_id) > (after_distance, after_case_id))
+            ORDER BY c.keyword_vectors <=> query_embedding
+            LIMIT match_count;
+        END;
+        $$;
+        GRANT EXECUTE ON FUNCTION match_case_ids(vector, TEXT, INT, DOUBLE PRECISION, TEXT) TO anon, authenticated;
+        """)
+    conn.commit()
+
+def match_case_ids(embedding, court="Any", limit=10, after=None):
+    """
+    Ids and cosine distances of the closest cases, ordered by (distance, case_id),
+    without their text. `after` is the (distance, case_id) of the last result
+    already seen; only cases ranked after it are returned. Courts are searched
+    separately and merged.
+    """
+    if isinstance(court, str):
+        courts = [court]
+    else:
+        courts = list(court) or ["Any"]
+    if "Any" in courts:
+        courts = ["Any"]
+
+    params = {"query_embedding": [float(x) for x in embedding], "match_count": limit}
+    if after is not None:
+        params["after_distance"], params["after_case_id"] = after
+
+    results = []
+    for court_filter in courts:
+        response = anon_supabase.rpc("match_case_ids", {**params, "court_filter": court_filter}).execute()
         for row in response.data or []:
             results.append({
-                "case_id": row.get("case_id"),
-                "case_name": row.get("case_name", "Unknown"),
-                "court": row.get("court", "Unknown"),
-                "url": row.get("url", "#"),
-                "summary": row.get("summary", "No summary available."),
-                "similarity_score": row.get("distance", 1.0),  # use distance from your SQL
+                "case_id": row["case_id"],
+                "similarity_score": row["distance"],
+                "duplicate_of": row.get("duplicate_of"),
             })
+
+    #The RPC orders by distance alone; case_id makes ties stable across pages.
+    #Exact ties only come from shared embeddings, i.e. near-duplicates, which are collapsed anyway.
+    return sorted(results, key=lambda r: (float(r["similarity_score"]), r["case_id"]))[:limit]
+
+def hydrate_cases(results):
+    """
+    Fill in name, court, url and summary for id-only results with one batched lookup
+    """
+    if not results:
         return results
+    response = anon_supabase.table("cases").select("case_id, case_name, court, url, summary") \
+        .in_("case_id", [res["case_id"] for res in results]).execute()
+    rows = {row["case_id"]: row for row in response.data or []}
+    for res in results:
+        row = rows.get(res["case_id"], {})
+        res["case_name"] = row.get("case_name") or "Unknown"
+        res["court"] = row.get("court") or "Unknown"
+        res["url"] = row.get("url") or "#"
+        res["summary"] = row.get("summary") or "No summary available."
+    return results
 
 def insert_database(conn, id, name, date, court, url, keywords,embeddings,summary):
     """
@@ -71,4 +221,20 @@ def insert_database(conn, id, name, date, court, url, keywords,embeddings,summar
     cur.execute(query, (id, name, date, court, url, keywords, embeddings, summary))
     conn.commit()
     cur.close()
-    logging.info("case inserted")
\ No newline at end of file
+    logging.info("case inserted")
+
+def update_database(conn, id, name, date, court, url, keywords, embeddings, summary):
+    """
+    Refresh the metadata and enrichment of a republished case
+    """
+    cur = conn.cursor()
+
+    query = """
+    UPDATE cases
+    SET case_name = %s, date = %s, court = %s, url = %s, keywords = %s, keyword_vectors = %s, summary = %s
+    WHERE case_id = %s;
+    """
+    cur.execute(query, (name, date, court, url, keywords, embeddings, summary, id))
+    conn.commit()
+    cur.close()
+    logging.info("case updated")
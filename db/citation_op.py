@@ -1,5 +1,7 @@
 """Contains functions to feed the citation table in my database."""
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from psycopg2.extras import execute_values
 from db.connection import conn 
 
 def get_priority_missing_cases(limit=100):
@@ -33,7 +35,176 @@ def fetch_unprocessed_links(batch_size: int=50):
 
     return results
 
+def iter_unprocessed_links(page_size: int=500):
+    """
+    Stream (case_id, url) for every unprocessed case using keyset pagination
+    over case_id, so memory stays flat however large the backlog is.
+    """
+    query = """
+            SELECT case_id, url
+            FROM cases
+            WHERE (neutral_extracted = FALSE OR citation_extracted = FALSE)
+            AND case_id > %s
+            ORDER BY case_id
+            LIMIT %s;
+        """
+    last_case_id = ""
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(query, (last_case_id, page_size))
+            page = cur.fetchall()
+        conn.commit()  # don't hold a transaction open between pages
+        if not page:
+            return
+        yield from page
+        last_case_id = page[-1][0]
+
+def ensure_unprocessed_index():
+    """Partial index that keeps each keyset page an index range scan."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS cases_unprocessed_links_idx
+        ON cases (case_id)
+        WHERE neutral_extracted = FALSE OR citation_extracted = FALSE
+    """)
+    conn.commit()
+    cur.close()
+
+def store_citation_batch(cur, results):
+    """
+    Write a batch of extraction results with a handful of set-based statements:
+    neutral citations, cited cases and the citation_extracted flags.
+    `results` are dicts as returned by api.extract_and_process_citations.
+    """
+    if not results:
+        return
+    case_ids = [r["case_id"] for r in results]
+
+    execute_values(cur, """
+        UPDATE cases
+        SET neutral_citation = v.neutral_citation,
+            neutral_extracted = TRUE
+        FROM (VALUES %s) AS v(case_id, neutral_citation)
+        WHERE cases.case_id = v.case_id
+    """, [(r["case_id"], r["neutral_citation"]) for r in results])
+
+    cited = [(r["case_id"], c["citation_text"], c["context"]) for r in results for c in r["cited_cases"]]
+    if cited:
+        cur.execute("""
+            SELECT neutral_citation, case_id FROM cases
+            WHERE neutral_citation = ANY(%s)
+        """, (list({text for _, text, _ in cited}),))
+        known = dict(cur.fetchall())
+
+        linked = execute_values(cur, """
+            INSERT INTO case_citations
+                (citing_case_id, cited_case_id, cited_case_name, citation_context)
+            VALUES %s
+            ON CONFLICT (citing_case_id, cited_case_id) DO NOTHING
+            RETURNING cited_case_id
+        """, [(citing, known.get(text), text, context) for citing, text, context in cited], fetch=True)
+        bump_citation_counts(cur, [row[0] for row in linked])
+
+    cur.execute("""
+        UPDATE cases SET citation_extracted = TRUE
+        WHERE case_id = ANY(%s)
+    """, (case_ids,))
+
+def process_unprocessed_links(extract=None, workers: int=8, commit_every: int=50, page_size: int=500):
+    """
+    Download and parse unprocessed cases on a worker pool while the calling
+    thread writes results back in batched transactions. At most
+    `workers * 2` cases are in flight, so memory does not grow with the backlog.
+
+    extract: callable(case_id, url) -> result dict, defaults to
+    api.extract_and_process_citations.
+    """
+    if extract is None:
+        from utils.api import extract_and_process_citations as extract
+
+    processed, failed = 0, 0
+    pending, batch = set(), []
+
+    def flush():
+        nonlocal processed, failed
+        if not batch:
+            return
+        cur = conn.cursor()
+        try:
+            store_citation_batch(cur, batch)
+            conn.commit()
+            processed += len(batch)
+        except Exception as e:
+            # Fall back to one transaction per case to isolate the bad row
+            logging.error(f"Batch write failed, retrying case by case: {e}")
+            conn.rollback()
+            for result in batch:
+                try:
+                    store_citation_batch(cur, [result])
+                    conn.commit()
+                    processed += 1
+                except Exception as e:
+                    logging.error(f"Failed on {result['case_id']}: {e}")
+                    conn.rollback()
+                    failed += 1
+        finally:
+            cur.close()
+        logging.info(f"Committed {processed} cases ({failed} failed)")
+        batch.clear()
+
+    def collect(done):
+        nonlocal failed
+        for future in done:
+            result = future.result()
+            if result["success"]:
+                batch.append(result)
+            else:
+                failed += 1
+        if len(batch) >= commit_every:
+            flush()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for case_id, url in iter_unprocessed_links(page_size):
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(pool.submit(extract, case_id, url))
+        collect(pending)
+    flush()
+
+    logging.info(f"Processed {processed} cases, {failed} failed")
+    return processed, failed
+
+def ensure_citation_counts_table():
+    """Create the delta-maintained citation counters table if it does not exist."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS case_citation_counts (
+            case_id TEXT PRIMARY KEY,
+            cited_by_count INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    conn.commit()
+    cur.close()
+
+def bump_citation_counts(cur, cited_case_ids):
+    """Add newly linked citations to the counters. Runs in the caller's transaction."""
+    cited_case_ids = [case_id for case_id in cited_case_ids if case_id is not None]
+    if not cited_case_ids:
+        return
+    cur.execute("""
+        INSERT INTO case_citation_counts (case_id, cited_by_count)
+        SELECT case_id, COUNT(*)
+        FROM unnest(%s::text[]) AS case_id
+        GROUP BY case_id
+        ON CONFLICT (case_id) DO UPDATE
+        SET cited_by_count = case_citation_counts.cited_by_count + EXCLUDED.cited_by_count,
+            updated_at = now()
+    """, (cited_case_ids,))
+
 def insert_citations(cur, citing_case_id, citations):
+    linked = []
     for citation in citations:
         citation_text = citation["citation_text"]
         context = citation["context"]
@@ -51,7 +222,52 @@ def insert_citations(cur, citing_case_id, citations):
                 (citing_case_id, cited_case_id, cited_case_name, citation_context)
             VALUES (%s, %s, %s, %s)
             ON CONFLICT (citing_case_id, cited_case_id) DO NOTHING
+            RETURNING cited_case_id
         """, (citing_case_id, cited_case_id, citation_text, context))
+        inserted = cur.fetchone()
+        if inserted:
+            linked.append(inserted[0])
+
+    bump_citation_counts(cur, linked)
+
+def mark_citations_extracted(cur, case_id):
+    cur.execute("""
+        UPDATE cases SET citation_extracted = TRUE
+        WHERE case_id = %s
+    """, (case_id,))
+
+def relink_citations(citations=None):
+    """
+    Resolve unmatched case_citations rows against cases.neutral_citation in one
+    set-based UPDATE. Restrict to `citations` (a list of citation texts) when given.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE case_citations cc
+        SET cited_case_id = c.case_id
+        FROM cases c
+        WHERE cc.cited_case_id IS NULL
+          AND c.neutral_citation = cc.cited_case_name
+          AND (%(citations)s::text[] IS NULL OR cc.cited_case_name = ANY(%(citations)s::text[]))
+          -- one row per (citing case, citation) so the unique key cannot collide
+          AND cc.citation_id IN (
+              SELECT MIN(citation_id)
+              FROM case_citations
+              WHERE cited_case_id IS NULL
+              GROUP BY citing_case_id, cited_case_name
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM case_citations d
+              WHERE d.citing_case_id = cc.citing_case_id
+                AND d.cited_case_id = c.case_id
+          )
+        RETURNING cc.cited_case_id
+    """, {"citations": list(citations) if citations is not None else None})
+    linked = [row[0] for row in cur.fetchall()]
+    bump_citation_counts(cur, linked)
+    conn.commit()
+    cur.close()
+    return len(linked)
 
 def update_neutral_citation(cur, case_id, neutral_citation):
     cur.execute("""
@@ -75,6 +291,7 @@ def retry_unmatched_citations():
     
     unmatched = cur.fetchall()
     matched_count = 0
+    linked = []
     
     for citation_id, citing_case_id, citation_text in unmatched:
         # Try to match
@@ -94,19 +311,60 @@ def retry_unmatched_citations():
                 WHERE citation_id = %s
             """, (result[0], citation_id))
             matched_count += 1
+            linked.append(result[0])
     
+    bump_citation_counts(cur, linked)
     conn.commit()
     return matched_count
 
 def get_citation_counter(cur, case_id):
-    """Get the number of times a case has been cited."""
-    query = "SELECT COUNT(*) FROM case_citations WHERE cited_case_id = %s;"
+    """Get the number of times a case has been cited, from the maintained counters."""
+    query = "SELECT cited_by_count FROM case_citation_counts WHERE case_id = %s;"
     cur.execute(query, (case_id,))
-    count = cur.fetchone()[0]
-    return count
+    result = cur.fetchone()
+    return result[0] if result else 0
+
+def reconcile_citation_counts():
+    """
+    Verify the counters against the full aggregate over case_citations and
+    repair any drift. Seeds the table on first run. Returns the number of
+    counters that had to be corrected.
+    """
+    ensure_citation_counts_table()
+    cur = conn.cursor()
+    cur.execute("""
+        WITH actual AS (
+            SELECT cited_case_id AS case_id, COUNT(*) AS cited_by_count
+            FROM case_citations
+            WHERE cited_case_id IS NOT NULL
+            GROUP BY cited_case_id
+        )
+        SELECT COALESCE(a.case_id, c.case_id), COALESCE(a.cited_by_count, 0)
+        FROM actual a
+        FULL OUTER JOIN case_citation_counts c ON c.case_id = a.case_id
+        WHERE c.cited_by_count IS DISTINCT FROM COALESCE(a.cited_by_count, 0)
+    """)
+    drift = cur.fetchall()
+
+    if drift:
+        cur.execute("""
+            INSERT INTO case_citation_counts (case_id, cited_by_count)
+            SELECT * FROM unnest(%s::text[], %s::int[])
+            ON CONFLICT (case_id) DO UPDATE
+            SET cited_by_count = EXCLUDED.cited_by_count,
+                updated_at = now()
+        """, ([case_id for case_id, _ in drift], [count for _, count in drift]))
+        logging.warning(f"Reconciled {len(drift)} drifted citation counters")
+    conn.commit()
+    cur.close()
+    return len(drift)
 
 def refresh_citation_stats():
-    """Refresh the materialized view that aggregates citation counts."""
+    """
+    Refresh the materialized view that aggregates citation counts.
+    Recomputes over all of case_citations; prefer the case_citation_counts
+    counters, kept current by bump_citation_counts.
+    """
     cursor = conn.cursor()
     cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY case_citation_stats")
     conn.commit()
\ No newline at end of file
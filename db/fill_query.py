@@ -13,7 +13,7 @@ def log_queries(cur, session_id, query_text, extracted_keywords, query_embedding
     query = """
     INSERT INTO queries(session_id, query_text, extracted_keywords, query_embedding, query_id) 
     VALUES (%s, %s, %s, %s, %s)
-    ON CONFLICT (query_id) DO NOTHING;
+    ON CONFLICT DO NOTHING;
     """
     cur.execute(query, (session_id, query_text, keywords_json, query_embedding, query_id))
     logging.info("query inserted")
@@ -71,6 +71,29 @@ def log_search_transaction(query_data, results_data):
         conn.rollback()
 
 
+def log_result_page(results_data):
+    """
+    Logs the result rows of a later page of an already logged query in one transaction.
+    """
+    try:
+        with conn.cursor() as cur:
+            for result in results_data:
+                log_query_results(
+                    cur,
+                    result['query_id'],
+                    result['case_id'],
+                    result['rank'],
+                    result['similarity_score'],
+                    result['feedback_score'],
+                    result['query_result_id']
+                )
+        conn.commit()
+        logging.info("Transaction successful: result page has been logged.")
+
+    except Exception as e:
+        logging.error("Transaction failed: %s", e, exc_info=True)
+        conn.rollback()
+
 def update_feedback_score(query_result_id, feedback_score):
     """
     Updates the feedback score for a specific query result.
@@ -0,0 +1,158 @@
+"""Stored content fingerprints: exact hashes, MinHash signatures and their LSH bands."""
+import logging
+import numpy as np
+from psycopg2.extras import execute_values
+from .connection import conn
+from utils import fingerprint as fp
+
+
+def ensure_fingerprint_tables():
+    """
+    Add the fingerprint columns to cases and create the LSH band table
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        ALTER TABLE cases
+            ADD COLUMN IF NOT EXISTS content_hash TEXT,
+            ADD COLUMN IF NOT EXISTS minhash BYTEA,
+            ADD COLUMN IF NOT EXISTS source_updated TEXT,
+            ADD COLUMN IF NOT EXISTS duplicate_of TEXT;
+
+        CREATE TABLE IF NOT EXISTS case_minhash_bands (
+            band SMALLINT NOT NULL,
+            band_hash BIGINT NOT NULL,
+            case_id TEXT NOT NULL,
+            PRIMARY KEY (band, band_hash, case_id)
+        );
+        CREATE INDEX IF NOT EXISTS case_minhash_bands_case_idx ON case_minhash_bands (case_id);
+        """)
+    conn.commit()
+
+
+def get_fingerprint(case_id):
+    """
+    Stored (content_hash, source_updated, minhash) for a case, or None if the
+    case is not in the database. minhash is a uint32 array, or None.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT content_hash, source_updated, minhash FROM cases WHERE case_id = %s;", (case_id,))
+        row = cur.fetchone()
+    if row is None:
+        return None
+    content_hash, source_updated, minhash = row
+    return content_hash, source_updated, None if minhash is None else np.frombuffer(bytes(minhash), dtype=np.uint32)
+
+
+def is_up_to_date(case_id, updated):
+    """
+    True if the case is stored and the feed's <updated> is not newer than what was ingested
+    """
+    stored = get_fingerprint(case_id)
+    return stored is not None and stored[1] is not None and (updated is None or updated <= stored[1])
+
+
+def find_near_duplicate(signature, exclude=None, threshold=fp.NEAR_DUPLICATE_THRESHOLD):
+    """
+    Find the stored case whose text is most similar to `signature`.
+    Candidates come from shared LSH bands; returns (case_id, similarity)
+    for the best one at or above `threshold`, or None.
+    """
+    bands = list(enumerate(fp.lsh_bands(signature)))
+    with conn.cursor() as cur:
+        cur.execute("""
+        SELECT c.case_id, c.minhash, c.duplicate_of
+        FROM cases c
+        WHERE c.case_id IN (
+            SELECT b.case_id FROM case_minhash_bands b
+            WHERE (b.band, b.band_hash) IN %s
+        )
+          AND c.case_id IS DISTINCT FROM %s
+          AND c.summary IS NOT NULL;
+        """, (tuple(bands), exclude))
+        candidates = cur.fetchall()
+
+    best = None
+    for case_id, minhash, duplicate_of in candidates:
+        if minhash is None:
+            continue
+        score = fp.similarity(signature, np.frombuffer(bytes(minhash), dtype=np.uint32))
+        if score >= threshold and (best is None or score > best[1]):
+            # Point at the canonical case, never at another duplicate
+            best = (duplicate_of or case_id, score)
+    return best
+
+
+def get_enrichment(case_id):
+    """
+    Summary, keywords and keyword embedding already stored for a case
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT summary, keywords, keyword_vectors FROM cases WHERE case_id = %s;", (case_id,))
+        row = cur.fetchone()
+    if row is None:
+        return None
+    summary, keywords, vectors = row
+    if isinstance(vectors, str):
+        #pgvector columns come back as '[0.1,0.2,...]' text
+        vectors = [float(x) for x in vectors.strip("[]").split(",")]
+    return {"summary": summary, "keywords": keywords, "embedding": vectors}
+
+
+def store_fingerprint(cur, case_id, content_hash, signature, source_updated=None, duplicate_of=None):
+    """
+    Record a case's fingerprint and replace its LSH bands. Does not commit.
+    """
+    signature = np.asarray(signature, dtype=np.uint32)
+    cur.execute("""
+    UPDATE cases
+    SET content_hash = %s, minhash = %s, source_updated = COALESCE(%s, source_updated), duplicate_of = %s
+    WHERE case_id = %s;
+    """, (content_hash, signature.tobytes(), source_updated, duplicate_of, case_id))
+    cur.execute("DELETE FROM case_minhash_bands WHERE case_id = %s;", (case_id,))
+    execute_values(cur, """
+    INSERT INTO case_minhash_bands (band, band_hash, case_id) VALUES %s
+    ON CONFLICT DO NOTHING;
+    """, [(band, band_hash, case_id) for band, band_hash in enumerate(fp.lsh_bands(signature))])
+
+
+def get_duplicate_groups(case_ids):
+    """
+    Map each case id to its canonical case (itself unless it is a near-duplicate)
+    """
+    from .users_connection import anon_supabase
+
+    if not case_ids:
+        return {}
+    try:
+        response = anon_supabase.table("cases").select("case_id, duplicate_of").in_("case_id", list(case_ids)).execute()
+    except Exception as e:
+        logging.error(f"Could not look up near-duplicates: {e}")
+        return {case_id: case_id for case_id in case_ids}
+    groups = {case_id: case_id for case_id in case_ids}
+    for row in response.data or []:
+        groups[row["case_id"]] = row.get("duplicate_of") or row["case_id"]
+    return groups
+
+
+def collapse_near_duplicates(results, limit=None, seen=None):
+    """
+    Keep only the best-ranked result of each near-duplicate group. Results that
+    carry `duplicate_of` (match_case_ids rows) need no lookup. Groups in `seen`,
+    e.g. from earlier pages, are skipped, and the kept groups are added to it,
+    mapped to their result's similarity_score.
+    """
+    if all("duplicate_of" in res for res in results):
+        groups = {res["case_id"]: res["duplicate_of"] or res["case_id"] for res in results}
+    else:
+        groups = get_duplicate_groups([res["case_id"] for res in results])
+    seen = {} if seen is None else seen
+    collapsed = []
+    for res in results:
+        if limit is not None and len(collapsed) >= limit:
+            break
+        group = groups.get(res["case_id"], res["case_id"])
+        if group in seen:
+            continue
+        seen[group] = res["similarity_score"]
+        collapsed.append(res)
+    return collapsed
@@ -0,0 +1,219 @@
+"""Per-case ingestion journal: stage checkpoints, retry backoff and dead letters."""
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from .connection import conn
+
+# Ordered ingestion stages. A case's `stage` is the last one it completed.
+STAGES = ["fetched", "fingerprinted", "summarized", "keyworded", "embedded", "inserted", "citations_extracted"]
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_CAP_SECONDS = 6 * 60 * 60
+# An 'active' entry untouched for this long belongs to a run that crashed
+STALE_AFTER_SECONDS = 60 * 60
+
+COLUMNS = ["case_id", "title", "date", "court", "xml_link", "stage", "content", "summary",
+           "keywords", "embedding", "status", "attempts", "failed_stage", "last_error", "next_attempt_at",
+           "source_updated", "fingerprint"]
+
+
+def ensure_journal_table():
+    """
+    Create the ingestion_journal table if it does not exist yet
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS ingestion_journal (
+            case_id TEXT PRIMARY KEY,
+            title TEXT,
+            date TEXT,
+            court TEXT,
+            xml_link TEXT,
+            stage TEXT NOT NULL DEFAULT 'pending',
+            content JSONB,
+            summary TEXT,
+            keywords TEXT,
+            embedding JSONB,
+            status TEXT NOT NULL DEFAULT 'active',
+            attempts INT NOT NULL DEFAULT 0,
+            failed_stage TEXT,
+            last_error TEXT,
+            next_attempt_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS ingestion_journal_retry_idx
+            ON ingestion_journal (next_attempt_at) WHERE status = 'retry';
+        ALTER TABLE ingestion_journal
+            ADD COLUMN IF NOT EXISTS source_updated TEXT,
+            ADD COLUMN IF NOT EXISTS fingerprint JSONB;
+        """)
+    conn.commit()
+
+
+def _row_to_entry(row):
+    return dict(zip(COLUMNS, row))
+
+
+def start_case(case_id, title, date, court, xml_link, source_updated=None):
+    """
+    Register a case in the journal (no-op if already there) and return its entry
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        INSERT INTO ingestion_journal (case_id, title, date, court, xml_link, source_updated)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (case_id) DO NOTHING;
+        """, (case_id, title, date, court, xml_link, source_updated))
+        cur.execute(f"SELECT {', '.join(COLUMNS)} FROM ingestion_journal WHERE case_id = %s;", (case_id,))
+        row = cur.fetchone()
+    conn.commit()
+    return _row_to_entry(row)
+
+
+def restart_case(case_id, title, date, court, xml_link, source_updated):
+    """
+    Start a republished judgment over from the beginning with its new feed
+    metadata. Earlier stage outputs are cleared; the fingerprint stage decides
+    which of them actually need to be produced again.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        INSERT INTO ingestion_journal (case_id, title, date, court, xml_link, source_updated)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (case_id) DO UPDATE
+        SET title = EXCLUDED.title, date = EXCLUDED.date, court = EXCLUDED.court,
+            xml_link = EXCLUDED.xml_link, source_updated = EXCLUDED.source_updated,
+            stage = 'pending', status = 'active', attempts = 0, content = NULL, summary = NULL,
+            keywords = NULL, embedding = NULL, fingerprint = NULL, failed_stage = NULL,
+            last_error = NULL, next_attempt_at = NULL, updated_at = now();
+        """, (case_id, title, date, court, xml_link, source_updated))
+        cur.execute(f"SELECT {', '.join(COLUMNS)} FROM ingestion_journal WHERE case_id = %s;", (case_id,))
+        row = cur.fetchone()
+    conn.commit()
+    return _row_to_entry(row)
+
+
+def completed(entry, stage):
+    """
+    True if the journal entry has already passed `stage`
+    """
+    return STAGES.index(entry["stage"]) >= STAGES.index(stage) if entry["stage"] in STAGES else False
+
+
+def is_due(entry):
+    """
+    True unless the case is dead-lettered, finished, or waiting out its backoff
+    """
+    if entry["status"] in ("dead", "done"):
+        return False
+    if entry["status"] == "retry" and entry["next_attempt_at"] is not None:
+        return entry["next_attempt_at"] <= datetime.now(timezone.utc)
+    return True
+
+
+def record_stage(entry, stage, **outputs):
+    """
+    Mark `stage` complete and persist its outputs, committing immediately so a
+    crash never loses finished LLM or network work
+    """
+    assignments = ["stage = %s", "updated_at = now()"]
+    values = [stage]
+    for column, value in outputs.items():
+        assignments.append(f"{column} = %s")
+        values.append(json.dumps(value) if column in ("content", "embedding", "fingerprint") else value)
+    if stage == STAGES[-1]:
+        assignments += ["status = 'done'", "failed_stage = NULL", "last_error = NULL", "next_attempt_at = NULL"]
+
+    with conn.cursor() as cur:
+        cur.execute(f"UPDATE ingestion_journal SET {', '.join(assignments)} WHERE case_id = %s;",
+                    (*values, entry["case_id"]))
+    conn.commit()
+
+    entry["stage"] = stage
+    entry.update(outputs)
+    if stage == STAGES[-1]:
+        entry.update(status="done", failed_stage=None, last_error=None, next_attempt_at=None)
+    logging.info(f"{entry['case_id']}: stage '{stage}' complete")
+
+
+def record_failure(entry, stage, error, retry=True):
+    """
+    Record a failed stage. Schedules a retry with capped exponential backoff,
+    or moves the case to the dead-letter state once attempts run out.
+    """
+    attempts = entry["attempts"] + 1
+    dead = not retry or attempts >= MAX_ATTEMPTS
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_CAP_SECONDS)
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+            UPDATE ingestion_journal
+            SET attempts = %s,
+                status = %s,
+                failed_stage = %s,
+                last_error = %s,
+                next_attempt_at = CASE WHEN %s THEN NULL ELSE now() + make_interval(secs => %s) END,
+                updated_at = now()
+            WHERE case_id = %s;
+            """, (attempts, "dead" if dead else "retry", stage, str(error)[:1000], dead, delay, entry["case_id"]))
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Could not journal failure for {entry['case_id']}: {e}")
+        conn.rollback()
+        return
+
+    entry.update(attempts=attempts, status="dead" if dead else "retry", failed_stage=stage, last_error=str(error),
+                 next_attempt_at=None if dead else datetime.now(timezone.utc) + timedelta(seconds=delay))
+    if dead:
+        logging.error(f"{entry['case_id']} moved to dead letters after failing at '{stage}': {error}")
+    else:
+        logging.warning(f"{entry['case_id']} failed at '{stage}', retry {attempts} in {delay}s: {error}")
+
+
+def due_retries(limit=50, exclude=()):
+    """
+    Fetch journal entries whose retry backoff has expired, plus cases a crashed
+    run left half-way through without recording a failure. Case ids in
+    `exclude` are skipped.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"""
+        SELECT {', '.join(COLUMNS)}
+        FROM ingestion_journal
+        WHERE ((status = 'retry' AND next_attempt_at <= now())
+               OR (status = 'active' AND updated_at < now() - make_interval(secs => %s)))
+          AND NOT (case_id = ANY(%s))
+        ORDER BY COALESCE(next_attempt_at, updated_at)
+        LIMIT %s;
+        """, (STALE_AFTER_SECONDS, list(exclude), limit))
+        rows = cur.fetchall()
+    return [_row_to_entry(row) for row in rows]
+
+
+def dead_letters():
+    """
+    List cases that exhausted their retries, with the stage and error they died on
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        SELECT case_id, failed_stage, attempts, last_error, updated_at
+        FROM ingestion_journal
+        WHERE status = 'dead'
+        ORDER BY updated_at DESC;
+        """)
+        return cur.fetchall()
+
+
+def requeue_dead_letter(case_id):
+    """
+    Give a dead-lettered case a fresh set of attempts
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        UPDATE ingestion_journal
+        SET status = 'retry', attempts = 0, next_attempt_at = now(), updated_at = now()
+        WHERE case_id = %s AND status = 'dead';
+        """, (case_id,))
+    conn.commit()
@@ -0,0 +1,343 @@
+"""Monthly partitions, feedback rollups and Parquet archival for the search logs."""
+import os
+import json
+import logging
+from datetime import date, datetime, timezone
+from .connection import conn
+
+LOG_TABLES = ["queries", "query_results"]
+RETENTION_DAYS = int(os.environ.get("LOG_RETENTION_DAYS", 90))
+ARCHIVE_DIR = os.environ.get("LOG_ARCHIVE_DIR", "archives")
+ARCHIVE_CHUNK_ROWS = 5000
+
+
+def _is_partitioned(cur, table):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s);", (table,))
+    row = cur.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def _month_start(day, offset=0):
+    month = day.month - 1 + offset
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def ensure_partitioned_logs():
+    """
+    Turn queries and query_results into tables range-partitioned by month on a
+    new logged_at column. Existing rows are moved across once, keeping their
+    created_at where the old table had one.
+    """
+    with conn.cursor() as cur:
+        if all(_is_partitioned(cur, table) for table in LOG_TABLES):
+            return
+
+        for table in LOG_TABLES:
+            cur.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy;")
+            cur.execute(f"""
+            CREATE TABLE {table} (
+                LIKE {table}_legacy INCLUDING DEFAULTS,
+                logged_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            ) PARTITION BY RANGE (logged_at);
+            """)
+            cur.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT;")
+
+        # Unique keys on a partitioned table must include the partition key
+        cur.execute("""
+        ALTER TABLE queries ADD PRIMARY KEY (query_id, logged_at);
+        CREATE INDEX queries_session_idx ON queries (session_id);
+        ALTER TABLE query_results ADD PRIMARY KEY (query_result_id, logged_at);
+        CREATE INDEX query_results_query_idx ON query_results (query_id);
+        CREATE INDEX query_results_case_idx ON query_results (case_id);
+        """)
+
+        # Partitions must exist before the old rows are copied out of the default one
+        oldest = None
+        if _has_column(cur, "queries_legacy", "created_at"):
+            cur.execute("SELECT min(created_at) FROM queries_legacy;")
+            oldest = cur.fetchone()[0]
+        _create_partitions(cur, oldest.date() if oldest else date.today(), date.today())
+
+        for table in LOG_TABLES:
+            # query_results takes its parent query's timestamp so both land in the same month
+            if table == "query_results":
+                logged_at = "COALESCE((SELECT q.logged_at FROM queries q WHERE q.query_id = l.query_id LIMIT 1), now())"
+            elif _has_column(cur, f"{table}_legacy", "created_at"):
+                logged_at = "COALESCE(l.created_at, now())"
+            else:
+                logged_at = "now()"
+            cur.execute(f"INSERT INTO {table} SELECT l.*, {logged_at} FROM {table}_legacy l;")
+            logging.info(f"Moved {cur.rowcount} rows into partitioned {table}")
+
+        cur.execute("DROP TABLE query_results_legacy; DROP TABLE queries_legacy;")
+    conn.commit()
+
+
+def _has_column(cur, table, column):
+    cur.execute("""
+    SELECT EXISTS(SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = %s);
+    """, (table, column))
+    return cur.fetchone()[0]
+
+
+def _create_partitions(cur, first_day, last_day):
+    month = _month_start(first_day)
+    while month <= last_day:
+        for table in LOG_TABLES:
+            cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {_partition_name(table, month)} PARTITION OF {table}
+            FOR VALUES FROM (%s) TO (%s);
+            """, (month, _month_start(month, 1)))
+        month = _month_start(month, 1)
+
+
+def ensure_partitions(months_ahead=2):
+    """
+    Create this month's partitions and the next `months_ahead`, so inserts never
+    fall through to the default partition
+    """
+    today = date.today()
+    with conn.cursor() as cur:
+        _create_partitions(cur, today, _month_start(today, months_ahead))
+    conn.commit()
+
+
+def expired_months(retention_days=RETENTION_DAYS):
+    """
+    Months whose partitions ended more than `retention_days` ago, oldest first
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'queries'::regclass;
+        """)
+        names = [row[0] for row in cur.fetchall()]
+
+    cutoff = datetime.now(timezone.utc).date().toordinal() - retention_days
+    months = []
+    for name in names:
+        suffix = name.rsplit("_p", 1)[-1]
+        if not suffix.isdigit() or len(suffix) != 6:
+            continue
+        month = date(int(suffix[:4]), int(suffix[4:]), 1)
+        if _month_start(month, 1).toordinal() <= cutoff:
+            months.append(month)
+    return sorted(months)
+
+
+def ensure_feedback_stats_table():
+    """
+    Create the per-case feedback rollup table, its ledger of rolled-up months
+    and the ledger of archived months
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS case_feedback_stats (
+            case_id TEXT PRIMARY KEY,
+            impressions BIGINT NOT NULL DEFAULT 0,
+            ratings BIGINT NOT NULL DEFAULT 0,
+            rating_sum BIGINT NOT NULL DEFAULT 0,
+            rank_sum BIGINT NOT NULL DEFAULT 0,
+            last_seen TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE TABLE IF NOT EXISTS feedback_rollups (
+            month DATE PRIMARY KEY,
+            result_rows BIGINT NOT NULL,
+            rolled_up_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE TABLE IF NOT EXISTS log_archives (
+            month DATE PRIMARY KEY,
+            paths TEXT[] NOT NULL,
+            archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """)
+    conn.commit()
+
+
+def rollup_feedback(month):
+    """
+    Add one month of query_results to case_feedback_stats. Each month is
+    rolled up once; the ledger row is written in the same transaction.
+    """
+    partition = _partition_name("query_results", month)
+    with conn.cursor() as cur:
+        cur.execute("""
+        INSERT INTO feedback_rollups (month, result_rows) VALUES (%s, 0)
+        ON CONFLICT (month) DO NOTHING;
+        """, (month,))
+        if cur.rowcount == 0:
+            logging.info(f"Feedback for {month:%Y-%m} already rolled up")
+            conn.rollback()
+            return False
+
+        cur.execute(f"""
+        INSERT INTO case_feedback_stats AS s (case_id, impressions, ratings, rating_sum, rank_sum, last_seen)
+        SELECT case_id,
+               count(*),
+               count(feedback_score),
+               COALESCE(sum(feedback_score), 0),
+               COALESCE(sum(rank), 0),
+               max(logged_at)
+        FROM {partition}
+        WHERE case_id IS NOT NULL
+        GROUP BY case_id
+        ON CONFLICT (case_id) DO UPDATE
+        SET impressions = s.impressions + EXCLUDED.impressions,
+            ratings = s.ratings + EXCLUDED.ratings,
+            rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+            rank_sum = s.rank_sum + EXCLUDED.rank_sum,
+            last_seen = GREATEST(s.last_seen, EXCLUDED.last_seen),
+            updated_at = now();
+        """)
+        cur.execute(f"UPDATE feedback_rollups SET result_rows = (SELECT count(*) FROM {partition}) WHERE month = %s;",
+                    (month,))
+    conn.commit()
+    logging.info(f"Rolled up feedback for {month:%Y-%m}")
+    return True
+
+
+def _arrow_type(pa, data_type, udt_name):
+    if udt_name == "vector" or data_type == "ARRAY":
+        return pa.list_(pa.float32())
+    if data_type in ("smallint", "integer", "bigint"):
+        return pa.int64()
+    if data_type in ("real", "double precision", "numeric"):
+        return pa.float64()
+    if data_type == "boolean":
+        return pa.bool_()
+    if data_type.startswith("timestamp"):
+        return pa.timestamp("us", tz="UTC")
+    return pa.string()
+
+
+def _arrow_value(value, arrow_type, pa):
+    if value is None:
+        return None
+    if pa.types.is_list(arrow_type):
+        if isinstance(value, str):
+            #pgvector text form '[0.1,0.2,...]'
+            return [float(x) for x in value.strip("[]{}").split(",") if x]
+        return [float(x) for x in value]
+    if pa.types.is_string(arrow_type) and not isinstance(value, str):
+        return json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+    if pa.types.is_floating(arrow_type):
+        return float(value)
+    return value
+
+
+def archive_partition(table, month, out_dir=ARCHIVE_DIR):
+    """
+    Stream one monthly partition to a zstd-compressed Parquet file through a
+    server-side cursor and check the written row count. Returns the path.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    partition = _partition_name(table, month)
+    with conn.cursor() as cur:
+        cur.execute("""
+        SELECT column_name, data_type, udt_name FROM information_schema.columns
+        WHERE table_name = %s ORDER BY ordinal_position;
+        """, (partition,))
+        columns = cur.fetchall()
+    schema = pa.schema([(name, _arrow_type(pa, data_type, udt)) for name, data_type, udt in columns])
+
+    os.makedirs(os.path.join(out_dir, table), exist_ok=True)
+    path = os.path.join(out_dir, table, f"{partition}.parquet")
+    tmp_path = path + ".tmp"
+    written = 0
+
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+        with conn.cursor(name=f"archive_{partition}") as cur:
+            cur.itersize = ARCHIVE_CHUNK_ROWS
+            cur.execute(f"SELECT {', '.join(name for name, _, _ in columns)} FROM {partition};")
+            while True:
+                rows = cur.fetchmany(ARCHIVE_CHUNK_ROWS)
+                if not rows:
+                    break
+                arrays = [
+                    pa.array([_arrow_value(row[i], field.type, pa) for row in rows], type=field.type)
+                    for i, field in enumerate(schema)
+                ]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                written += len(rows)
+    conn.commit()
+
+    if pq.ParquetFile(tmp_path).metadata.num_rows != written:
+        raise RuntimeError(f"Archive of {partition} is incomplete")
+    os.replace(tmp_path, path)
+    logging.info(f"Archived {written} rows of {partition} to {path}")
+    return path
+
+
+def archived_months():
+    """
+    Months already exported to Parquet, from the log_archives ledger
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT month FROM log_archives;")
+        months = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    return months
+
+
+def record_archive(month, paths):
+    """
+    Add (or refresh) a month's entry in the log_archives ledger
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        INSERT INTO log_archives (month, paths) VALUES (%s, %s)
+        ON CONFLICT (month) DO UPDATE SET paths = EXCLUDED.paths, archived_at = now();
+        """, (month, paths))
+    conn.commit()
+
+
+def drop_month(month):
+    """
+    Detach and drop one month's query_results and queries partitions
+    """
+    with conn.cursor() as cur:
+        for table in reversed(LOG_TABLES):
+            partition = _partition_name(table, month)
+            cur.execute(f"ALTER TABLE {table} DETACH PARTITION {partition};")
+            cur.execute(f"DROP TABLE {partition};")
+    conn.commit()
+    logging.info(f"Dropped log partitions for {month:%Y-%m}")
+
+
+def maintain_logs(retention_days=RETENTION_DAYS, out_dir=ARCHIVE_DIR, drop=False):
+    """
+    Partition maintenance: create upcoming partitions, then roll up and archive
+    every expired month not yet in the log_archives ledger. Months are only
+    dropped with `drop=True`, once both of their archives are written and
+    verified; only ask for that when out_dir is durable storage, as the
+    partitions are the only other copy. A drop run exports ledgered months
+    again first, since their earlier archive may not have been durable.
+    """
+    ensure_partitioned_logs()
+    ensure_partitions()
+    ensure_feedback_stats_table()
+
+    done = set() if drop else archived_months()
+    archived = []
+    for month in expired_months(retention_days):
+        if month in done:
+            continue
+        try:
+            rollup_feedback(month)
+            paths = [archive_partition(table, month, out_dir) for table in LOG_TABLES]
+            record_archive(month, paths)
+            if drop:
+                drop_month(month)
+            archived += paths
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Log maintenance for {month:%Y-%m} failed, partition kept: {e}")
+    return archived
@@ -0,0 +1,223 @@
+"""Shared ingestion work queue: leases with SKIP LOCKED, expiry and worker heartbeats."""
+import os
+import socket
+import logging
+import threading
+import psycopg2
+from psycopg2.extras import execute_values
+from .connection import conn, DATABASE_URL
+
+# A lease must be renewed within this long or another worker may take the case
+LEASE_SECONDS = int(os.environ.get("QUEUE_LEASE_SECONDS", 300))
+# Hard limit on how long one worker may keep renewing a single case
+MAX_LEASE_SECONDS = int(os.environ.get("QUEUE_MAX_LEASE_SECONDS", 3600))
+HEARTBEAT_SECONDS = int(os.environ.get("QUEUE_HEARTBEAT_SECONDS", 30))
+# Workers silent for this long are presumed dead and lose their leases
+WORKER_TIMEOUT_SECONDS = int(os.environ.get("QUEUE_WORKER_TIMEOUT_SECONDS", 180))
+
+QUEUE_COLUMNS = ["case_id", "title", "date", "court", "xml_link", "source_updated"]
+
+
+def ensure_queue_tables():
+    """
+    Create the ingest_queue and ingest_workers tables if they do not exist yet
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_queue (
+            case_id TEXT PRIMARY KEY,
+            title TEXT,
+            date TEXT,
+            court TEXT,
+            xml_link TEXT,
+            source_updated TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            available_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            leased_by TEXT,
+            leased_at TIMESTAMPTZ,
+            lease_expires_at TIMESTAMPTZ,
+            claims INT NOT NULL DEFAULT 0,
+            enqueued_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS ingest_queue_ready_idx
+            ON ingest_queue (available_at) WHERE status = 'queued';
+        CREATE INDEX IF NOT EXISTS ingest_queue_leased_idx
+            ON ingest_queue (lease_expires_at) WHERE status = 'leased';
+
+        CREATE TABLE IF NOT EXISTS ingest_workers (
+            worker_id TEXT PRIMARY KEY,
+            hostname TEXT,
+            pid INT,
+            started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            current_case TEXT,
+            processed INT NOT NULL DEFAULT 0,
+            failed INT NOT NULL DEFAULT 0,
+            stopped_at TIMESTAMPTZ
+        );
+        """)
+    conn.commit()
+
+
+def enqueue(items):
+    """
+    Add feed entries, given as dicts with QUEUE_COLUMNS keys, to the queue.
+    Cases already queued or leased are left alone; finished ones are queued
+    again only when the feed shows a newer <updated>. Returns the number queued.
+    """
+    if not items:
+        return 0
+    with conn.cursor() as cur:
+        rows = execute_values(cur, """
+        INSERT INTO ingest_queue (case_id, title, date, court, xml_link, source_updated)
+        VALUES %s
+        ON CONFLICT (case_id) DO UPDATE
+        SET title = EXCLUDED.title, date = EXCLUDED.date, court = EXCLUDED.court,
+            xml_link = EXCLUDED.xml_link, source_updated = EXCLUDED.source_updated,
+            status = 'queued', available_at = now(), claims = 0, updated_at = now()
+        WHERE ingest_queue.status IN ('done', 'dead')
+          AND EXCLUDED.source_updated > COALESCE(ingest_queue.source_updated, '')
+        RETURNING case_id;
+        """, [tuple(item[c] for c in QUEUE_COLUMNS) for item in items], fetch=True)
+    conn.commit()
+    return len(rows)
+
+
+def claim(worker_id, limit=1, lease_seconds=LEASE_SECONDS):
+    """
+    Lease up to `limit` ready cases to `worker_id`. Ready means queued and past
+    its backoff, or leased with an expired lease or a silent worker. SKIP LOCKED
+    lets any number of workers claim at once without blocking or overlapping.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"""
+        UPDATE ingest_queue q
+        SET status = 'leased', leased_by = %(worker)s, leased_at = now(),
+            lease_expires_at = now() + make_interval(secs => %(lease)s),
+            claims = q.claims + 1, updated_at = now()
+        WHERE q.case_id IN (
+            SELECT case_id FROM ingest_queue
+            WHERE (status = 'queued' AND available_at <= now())
+               OR (status = 'leased' AND (
+                       lease_expires_at < now()
+                    OR leased_by IN (SELECT worker_id FROM ingest_workers
+                                     WHERE heartbeat_at < now() - make_interval(secs => %(timeout)s))))
+            ORDER BY available_at
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING {', '.join('q.' + c for c in QUEUE_COLUMNS)};
+        """, {"worker": worker_id, "lease": lease_seconds, "timeout": WORKER_TIMEOUT_SECONDS, "limit": limit})
+        rows = cur.fetchall()
+    conn.commit()
+    return [dict(zip(QUEUE_COLUMNS, row)) for row in rows]
+
+
+def release(worker_id, case_id, status="done", available_at=None):
+    """
+    Hand a leased case back: 'done', 'dead', or 'queued' again from
+    `available_at` (the journal's retry time). Ignored if the lease was lost.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        UPDATE ingest_queue
+        SET status = %s, available_at = COALESCE(%s, now()), leased_by = NULL,
+            lease_expires_at = NULL, updated_at = now()
+        WHERE case_id = %s AND status = 'leased' AND leased_by = %s;
+        """, (status, available_at, case_id, worker_id))
+        released = cur.rowcount == 1
+    conn.commit()
+    if not released:
+        logging.warning(f"Lease on {case_id} was lost before {worker_id} finished it")
+    return released
+
+
+def queue_depth():
+    """
+    Case counts per queue status
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT status, count(*) FROM ingest_queue GROUP BY status;")
+        return dict(cur.fetchall())
+
+
+class Heartbeat:
+    """
+    Registers a worker and, on its own connection so it never commits the
+    worker's transaction, records a heartbeat and renews the lease of the case
+    in hand every HEARTBEAT_SECONDS. Renewal stops after MAX_LEASE_SECONDS so
+    a stuck case is eventually handed to another worker.
+    """
+
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.current_case = None
+        self.conn = psycopg2.connect(DATABASE_URL)
+        self.conn.autocommit = True
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="queue-heartbeat", daemon=True)
+
+    def _execute(self, query, params):
+        with self._lock, self.conn.cursor() as cur:
+            cur.execute(query, params)
+            return cur.rowcount
+
+    def start(self):
+        self._execute("""
+        INSERT INTO ingest_workers (worker_id, hostname, pid) VALUES (%s, %s, %s)
+        ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = now(), stopped_at = NULL;
+        """, (self.worker_id, socket.gethostname(), os.getpid()))
+        self._thread.start()
+
+    def working_on(self, case_id):
+        self.current_case = case_id
+        self.beat()
+
+    def finished(self, ok):
+        self.current_case = None
+        column = "processed" if ok else "failed"
+        self._execute(f"""
+        UPDATE ingest_workers SET {column} = {column} + 1, current_case = NULL, heartbeat_at = now()
+        WHERE worker_id = %s;
+        """, (self.worker_id,))
+
+    def beat(self):
+        self._execute("""
+        UPDATE ingest_workers SET heartbeat_at = now(), current_case = %s WHERE worker_id = %s;
+        """, (self.current_case, self.worker_id))
+        if self.current_case is not None:
+            renewed = self._execute("""
+            UPDATE ingest_queue
+            SET lease_expires_at = now() + make_interval(secs => %s), updated_at = now()
+            WHERE case_id = %s AND status = 'leased' AND leased_by = %s
+              AND leased_at > now() - make_interval(secs => %s);
+            """, (LEASE_SECONDS, self.current_case, self.worker_id, MAX_LEASE_SECONDS))
+            if not renewed:
+                logging.warning(f"{self.worker_id} no longer holds the lease on {self.current_case}")
+
+    def _run(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            try:
+                self.beat()
+            except Exception as e:
+                logging.error(f"Heartbeat failed for {self.worker_id}: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._execute("UPDATE ingest_workers SET stopped_at = now(), current_case = NULL WHERE worker_id = %s;",
+                      (self.worker_id,))
+        self.conn.close()
+
+
+def prune_workers(older_than_days=7):
+    """
+    Forget workers that have not sent a heartbeat for `older_than_days`
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        DELETE FROM ingest_workers WHERE heartbeat_at < now() - make_interval(days => %s);
+        """, (older_than_days,))
+    conn.commit()
@@ -1,11 +1,14 @@
 import db.check as db
 import db.citation_op as CT
+import db.ingest_journal as journal
+import db.fingerprints as FP
 import time
-import json
 from db.connection import conn
 import utils.genai as llm
 import utils.api as source
-import logging 
+from utils import fingerprint
+from utils import profiling
+import logging
 
 # Logging setup
 logging.basicConfig(
@@ -16,87 +19,202 @@ gemini = llm.gemini_model()
 gemini1 = llm.gemini_model1()
 embed_model = llm.load_model()
 
-def log_missing_case(case_id):
+def store_citations(case_id, xml_link):
     """
-    Insert cases that couldn't be added to the database to a file for record
+    Extract the neutral citation and cited cases of an inserted case and store them
     """
+    citation_data = source.extract_and_process_citations(case_id, xml_link)
+    if not citation_data['success']:
+        raise RuntimeError(f"Citation extraction failed: {citation_data['error']}")
+
+    cur = conn.cursor()
     try:
-        with open("missing_cases", "r") as file:
-            missing_case = json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        missing_case = []
-    missing_case.append(case_id)
-    with open("missing_cases", "w") as f:
-        json.dump(missing_case, f)
+        # Update neutral citation
+        if citation_data['neutral_citation']:
+            CT.update_neutral_citation(cur, case_id, citation_data['neutral_citation'])
+            logging.info(f"Updated neutral citation for {case_id}: {citation_data['neutral_citation']}")
 
-def main():
-    #Loop through each case per page
-    for entry in source.fetch_page(delay=200):
-            #Extract case id
-            case_id = source.get_caseid(entry)
-            logging.info(case_id)
+        # Insert cited cases
+        if citation_data['cited_cases']:
+            CT.insert_citations(cur, case_id, citation_data['cited_cases'])
+            logging.info(f"Inserted {len(citation_data['cited_cases'])} citations for {case_id}")
 
-            if db.check_database(case_id):
-                #Skip case if already inserted
-                logging.info(f"Skipping {case_id}, already exists in DB.")
-                continue
+        CT.mark_citations_extracted(cur, case_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def fingerprint_case(entry):
+    """
+    Hash the fetched text and decide which enrichment can be reused: the
+    case's own, if its text is unchanged since the last ingestion, or that of
+    a stored near-duplicate. Returns (fingerprint, reused enrichment or None).
+    """
+    case_id = entry["case_id"]
+    signature = fingerprint.minhash(entry["content"])
+    info = {
+        "content_hash": fingerprint.content_hash(entry["content"]),
+        "minhash": signature.tolist(),
+        "unchanged": False,
+        "duplicate_of": None,
+    }
+
+    stored = FP.get_fingerprint(case_id)
+    # Rows ingested before fingerprinting have no hash; their text is taken as the baseline
+    if stored is not None and stored[0] in (None, info["content_hash"]):
+        info["unchanged"] = True
+        logging.info(f"{case_id}: text unchanged, reusing stored enrichment")
+        return info, FP.get_enrichment(case_id)
+
+    # A republish with small edits is compared with its own earlier version first
+    if stored is not None and stored[2] is not None:
+        score = fingerprint.similarity(signature, stored[2])
+        if score >= fingerprint.NEAR_DUPLICATE_THRESHOLD:
+            logging.info(f"{case_id}: text barely changed ({score:.2f}), reusing its own enrichment")
+            return info, FP.get_enrichment(case_id)
+
+    match = FP.find_near_duplicate(signature, exclude=case_id)
+    if match is not None:
+        info["duplicate_of"] = match[0]
+        logging.info(f"{case_id}: near-duplicate of {match[0]} ({match[1]:.2f}), reusing its enrichment")
+        return info, FP.get_enrichment(match[0])
+    return info, None
+
+def process_case(entry):
+    """
+    Run the ingestion stages for one journal entry, resuming after the last
+    completed stage. Every finished stage is checkpointed, so a retry never
+    repeats LLM or network work that already succeeded.
+    """
+    case_id = entry["case_id"]
+    stage = "fetched"
+    #Only runs that called Gemini need to wait before the next case
+    called_llm = False
+    try:
+        if not journal.completed(entry, "fetched"):
+            case_content = source.case_content(entry["xml_link"])
+            journal.record_stage(entry, "fetched", content=case_content)
+
+        stage = "fingerprinted"
+        if not journal.completed(entry, "fingerprinted"):
+            info, reused = fingerprint_case(entry)
+            if reused and reused["summary"] and reused["keywords"] and reused["embedding"] is not None:
+                #Nothing the LLM or encoder would see has changed
+                journal.record_stage(entry, "embedded", fingerprint=info, **reused)
             else:
-                title, date, court, xml_link = source.extract_case(entry)
+                journal.record_stage(entry, "fingerprinted", fingerprint=info)
 
-            if xml_link is not None: 
-                case_content = source.case_content(xml_link)
+        stage = "summarized"
+        if not journal.completed(entry, "summarized"):
+            #Generate case summary
+            called_llm = True
+            summary = llm.produce_summary(entry["content"], gemini1)
+            if summary is None:
+                raise RuntimeError("No summary generated")
+            journal.record_stage(entry, "summarized", summary=summary)
+            time.sleep(30)
 
-                #Generate case summary
-                summary = llm.produce_summary(case_content, gemini1)
+        stage = "keyworded"
+        if not journal.completed(entry, "keyworded"):
+            #Extract keywords from case content
+            called_llm = True
+            keywords = llm.extract_keywords(entry["content"], gemini)
+            if keywords is None:
+                raise RuntimeError("No keywords extracted")
+            journal.record_stage(entry, "keyworded", keywords=keywords)
 
+        stage = "embedded"
+        if not journal.completed(entry, "embedded"):
+            #Embed keywords
+            embedded_keywords = llm.generate_embeddings(entry["keywords"], embed_model)
+            journal.record_stage(entry, "embedded", embedding=embedded_keywords)
+
+        stage = "inserted"
+        if not journal.completed(entry, "inserted"):
+            #Insert metadata into database, or refresh it for a republished case
+            store = db.update_database if db.check_database(case_id) else db.insert_database
+            store(conn, case_id, entry["title"], entry["date"], entry["court"], entry["xml_link"],
+                  entry["keywords"], entry["embedding"], entry["summary"])
+
+            info = entry.get("fingerprint") or {
+                "content_hash": fingerprint.content_hash(entry["content"]),
+                "minhash": fingerprint.minhash(entry["content"]).tolist(),
+                "unchanged": False,
+                "duplicate_of": None,
+            }
+            with conn.cursor() as cur:
+                FP.store_fingerprint(cur, case_id, info["content_hash"], info["minhash"],
+                                     entry.get("source_updated"), info["duplicate_of"])
+            conn.commit()
+            journal.record_stage(entry, "inserted")
+            if called_llm:
                 time.sleep(30)
 
-                if summary is not None: 
-                    #Extract keywords from case content
-                    keywords = llm.extract_keywords(case_content, gemini)
-                    try: 
-                        #Embed keywords
-                        embedded_keywords = llm.generate_embeddings(keywords, embed_model) 
-                        #Insert metadata into database
-                        db.insert_database(conn, case_id, title, date, court, xml_link, keywords, embedded_keywords, summary)
-                        time.sleep(30)
-                        
-                        #Extract and process citations
-                        citation_data = source.extract_and_process_citations(case_id, xml_link)
-                        if citation_data['success']:
-                            cur = conn.cursor()
-                            try:
-                                # Update neutral citation
-                                if citation_data['neutral_citation']:
-                                    CT.update_neutral_citation(cur, case_id, citation_data['neutral_citation'])
-                                    logging.info(f"Updated neutral citation for {case_id}: {citation_data['neutral_citation']}")
-                                
-                                # Insert cited cases
-                                if citation_data['cited_cases']:
-                                    CT.insert_citations(cur, case_id, citation_data['cited_cases'])
-                                    logging.info(f"Inserted {len(citation_data['cited_cases'])} citations for {case_id}")
-                                
-                                conn.commit()
-                            except Exception as e:
-                                logging.error(f"Failed to insert citations for case {case_id}: {e}")
-                                conn.rollback()
-                            finally:
-                                cur.close()
-                        else:
-                            logging.warning(f"Citation extraction failed for {case_id}: {citation_data['error']}")
-                    except Exception as e: 
-                        logging.error(f"case {case_id} failed during keyword embedding or DB insertion: {e}")
-                        log_missing_case(case_id)
-                        continue     
-                            
-                else: 
-                    logging.error(f"[FAIL] No summary generated for case {case_id}. Not inserted")
-                    log_missing_case(case_id)
-                    continue 
-            else: 
-                logging.error(f"[FAIL] xml link not found")
-                log_missing_case(case_id)
+        stage = "citations_extracted"
+        if not journal.completed(entry, "citations_extracted"):
+            #Extract and process citations, unless the text they come from is unchanged
+            if not (entry.get("fingerprint") or {}).get("unchanged"):
+                store_citations(case_id, entry["xml_link"])
+            journal.record_stage(entry, "citations_extracted")
+        return True
+
+    except Exception as e:
+        conn.rollback()
+        journal.record_failure(entry, stage, e)
+        return False
+
+def ingest_case(case_id, title, date, court, xml_link, updated):
+    """
+    Open (or restart) the journal entry for a feed entry and process it.
+    Returns the journal entry afterwards.
+    """
+    stored = FP.get_fingerprint(case_id)
+    journal_entry = journal.start_case(case_id, title, date, court, xml_link, updated)
+    if stored is not None and journal_entry["source_updated"] != updated:
+        #Republished (or never fingerprinted): refetch, then redo only what changed
+        logging.info(f"{case_id} updated at source, checking for changes.")
+        journal_entry = journal.restart_case(case_id, title, date, court, xml_link, updated)
+
+    if xml_link is None:
+        logging.error(f"[FAIL] xml link not found")
+        journal.record_failure(journal_entry, "fetched", "xml link not found", retry=False)
+        return journal_entry
+
+    if not journal.is_due(journal_entry):
+        #Dead-lettered or backing off; the retry worker owns it
+        logging.info(f"Skipping {case_id}, status '{journal_entry['status']}' in journal.")
+        return journal_entry
+
+    with profiling.profile(f"case-{case_id}", force=case_id in profiling.FORCED_CASES):
+        process_case(journal_entry)
+    return journal_entry
+
+def ensure_tables():
+    journal.ensure_journal_table()
+    CT.ensure_citation_counts_table()
+    FP.ensure_fingerprint_tables()
+    db.ensure_case_lookup_indexes()
+    db.ensure_search_functions()
+
+def main():
+    ensure_tables()
+    #Loop through each case per page
+    for entry in source.fetch_page(delay=200):
+            #Extract case id, or the id a backfill stored the judgment under
+            title, date, court, xml_link = source.extract_case(entry)
+            case_id = db.resolve_case_id(source.get_caseid(entry), xml_link, source.get_feed_citation(entry))
+            logging.info(case_id)
+            updated = source.get_updated(entry)
+
+            if FP.is_up_to_date(case_id, updated):
+                #Skip case if already inserted and not republished since
+                logging.info(f"Skipping {case_id}, already exists in DB.")
                 continue
 
+            ingest_case(case_id, title, date, court, xml_link, updated)
+
 if __name__ == "__main__":
-    main()     
\ No newline at end of file
+    main()
@@ -0,0 +1,19 @@
+from db.log_maintenance import maintain_logs
+import argparse
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition, roll up and archive the search logs.")
+    parser.add_argument("--drop", action="store_true",
+                        help="drop expired partitions after archiving them; only when LOG_ARCHIVE_DIR is durable storage")
+    args = parser.parse_args()
+
+    archived = maintain_logs(drop=args.drop)
+    logger.info(f"Log maintenance complete: {len(archived)} partitions archived"
+                f"{', expired months dropped' if args.drop else ', none dropped'}.")
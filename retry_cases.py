@@ -0,0 +1,41 @@
+import db.ingest_journal as journal
+from main import process_case
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def retry_failed_cases(batch_size=50):
+    """
+    Resume every journalled case whose backoff has expired from its last
+    completed stage. Each case is tried at most once per run: one whose
+    failure could not be journalled would otherwise stay due and be retried
+    forever.
+    """
+    journal.ensure_journal_table()
+    succeeded, failed = 0, 0
+    tried = set()
+
+    while True:
+        due = journal.due_retries(batch_size, exclude=tried)
+        if not due:
+            break
+        logger.info(f"Retrying {len(due)} cases.")
+
+        for entry in due:
+            tried.add(entry["case_id"])
+            logger.info(f"Resuming {entry['case_id']} after stage '{entry['stage']}' (attempt {entry['attempts'] + 1})")
+            if process_case(entry):
+                succeeded += 1
+            else:
+                failed += 1
+
+    logger.info(f"Retry run complete: {succeeded} recovered, {failed} failed again.")
+    for case_id, stage, attempts, error, updated_at in journal.dead_letters():
+        logger.warning(f"Dead letter {case_id}: failed at '{stage}' after {attempts} attempts: {error}")
+
+if __name__ == "__main__":
+    retry_failed_cases()
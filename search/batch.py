@@ -0,0 +1,84 @@
+"""Batch search: many queries scored against the case matrix at once."""
+import numpy as np
+import utils.genai as llm
+from search.filters import bitmap_index
+from search.snapshot import DIM, current_snapshot
+
+# Queries scored per matmul; bounds the score matrix at QUERY_BLOCK x cases
+QUERY_BLOCK = 256
+
+
+def embed_queries(texts, nlp, embedding_model, batch_size=64):
+    """
+    Redact and embed a list of queries in one pass each. Returns an
+    L2-normalised float32 matrix, one row per query.
+    """
+    if len(texts) == 0:
+        return np.empty((0, DIM), dtype=np.float32)
+    redacted = llm.filter_inputs(texts, nlp)
+    embeddings = np.asarray(embedding_model.encode(redacted, batch_size=batch_size), dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.clip(norms, 1e-12, None)
+
+
+def score_batch(vectors, queries, limit):
+    """
+    Score every query against every vector with one matmul per block of
+    queries, then take each row's top `limit` with argpartition.
+    Returns (indices, scores), both shaped (queries, limit), best first.
+    """
+    limit = min(limit, len(vectors))
+    indices = np.empty((len(queries), limit), dtype=np.int64)
+    scores = np.empty((len(queries), limit), dtype=np.float32)
+
+    for start in range(0, len(queries), QUERY_BLOCK):
+        block = queries[start:start + QUERY_BLOCK] @ vectors.T
+        if limit < block.shape[1]:
+            top = np.argpartition(-block, limit - 1, axis=1)[:, :limit]
+        else:
+            top = np.broadcast_to(np.arange(block.shape[1]), block.shape).copy()
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        indices[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + len(block)] = np.take_along_axis(top_scores, order, axis=1)
+
+    return indices, scores
+
+
+def batch_fetch_cases(embeddings, snapshot=None, courts=None, date_from=None, date_to=None, limit=10):
+    """
+    Batch counterpart of db.check.fetch_cases for precomputed embeddings.
+    Returns one result list per query, each shaped like fetch_cases.
+    """
+    snapshot = snapshot or current_snapshot()
+    queries = np.asarray(embeddings, dtype=np.float32)
+    if queries.ndim == 1:
+        queries = queries[None, :]
+    queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+
+    mask = bitmap_index(snapshot).mask(courts, date_from, date_to)
+    if mask is None:
+        rows, vectors = None, snapshot.vectors
+    else:
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return [[] for _ in queries]
+        vectors = snapshot.vectors[rows]
+
+    indices, scores = score_batch(vectors, queries, limit)
+    if rows is not None:
+        indices = rows[indices]
+
+    return [
+        [snapshot.record(int(i), 1.0 - float(score)) for i, score in zip(row_indices, row_scores)]
+        for row_indices, row_scores in zip(indices, scores)
+    ]
+
+
+def batch_search(texts, nlp, embedding_model, snapshot=None, courts=None, date_from=None, date_to=None, limit=10):
+    """
+    Redact, embed and search a list of free-text queries in one batch.
+    Skips Gemini keyword extraction, so it embeds the redacted text itself.
+    """
+    embeddings = embed_queries(texts, nlp, embedding_model)
+    return batch_fetch_cases(embeddings, snapshot, courts, date_from, date_to, limit)
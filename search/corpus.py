@@ -0,0 +1,292 @@
+"""
+Columnar export of the case corpus for offline work.
+
+    python -m search.corpus export                 # cases + case_citations -> CORPUS_DIR
+    python -m search.corpus snapshot               # build the search snapshot from the export
+    python -m search.corpus load                   # time a full load
+
+The export is a directory of Parquet part files (zstd, one part per
+PART_ROWS rows) plus a manifest:
+
+    corpus/
+        manifest.json
+        cases/part-00000.parquet ...
+        case_citations/part-00000.parquet ...
+
+Keyword vectors are stored as fixed_size_list<float32>[DIM]. load_corpus()
+converts each table once to an uncompressed Arrow IPC file next to the parts
+and memory-maps it, so later loads are zero-copy and case_vectors() returns
+a numpy view of the mapped file.
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import datetime
+import logging
+import numpy as np
+from search.snapshot import DIM, SNAPSHOT_PATH, parse_vector, write_snapshot
+
+# Logging setup
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+CORPUS_DIR = os.environ.get("CORPUS_DIR", "corpus")
+PART_ROWS = 50000
+FETCH_ROWS = 5000
+
+CASES_QUERY = """
+    SELECT case_id, case_name, court, date, url, neutral_citation, keywords, summary, keyword_vectors
+    FROM cases
+    ORDER BY case_id;
+"""
+CITATIONS_QUERY = """
+    SELECT citing_case_id, cited_case_id, cited_case_name, citation_context
+    FROM case_citations
+    ORDER BY citing_case_id;
+"""
+
+
+def cases_schema(dim=DIM):
+    import pyarrow as pa
+
+    return pa.schema([
+        ("case_id", pa.string()),
+        ("case_name", pa.string()),
+        ("court", pa.string()),
+        ("date", pa.date32()),
+        ("url", pa.string()),
+        ("neutral_citation", pa.string()),
+        ("keywords", pa.string()),
+        ("summary", pa.string()),
+        ("keyword_vectors", pa.list_(pa.float32(), dim)),
+    ])
+
+
+def citations_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("citing_case_id", pa.string()),
+        ("cited_case_id", pa.string()),
+        ("cited_case_name", pa.string()),
+        ("citation_context", pa.string()),
+    ])
+
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value)[:10])
+    except (ValueError, TypeError):
+        return None
+
+
+def _vector_array(values, dim):
+    """
+    Fixed-size list array from pgvector values, with nulls for missing vectors
+    """
+    import pyarrow as pa
+
+    flat = np.zeros((len(values), dim), dtype=np.float32)
+    missing = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        if value is None:
+            missing[i] = True
+        else:
+            flat[i] = parse_vector(value)
+    return pa.FixedSizeListArray.from_arrays(pa.array(flat.ravel()), dim, mask=pa.array(missing))
+
+
+def _record_batch(rows, schema, dim):
+    import pyarrow as pa
+
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.name == "keyword_vectors":
+            arrays.append(_vector_array(values, dim))
+        elif field.name == "date":
+            arrays.append(pa.array([_to_date(v) for v in values], type=field.type))
+        else:
+            arrays.append(pa.array([None if v is None else str(v) for v in values], type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_table(query, schema, out_dir, part_rows=PART_ROWS, dim=DIM):
+    """
+    Stream a query through a server-side cursor into Parquet part files.
+    Returns the number of rows written.
+    """
+    import pyarrow.parquet as pq
+    from db.connection import conn
+
+    os.makedirs(out_dir, exist_ok=True)
+    total, part, writer, part_count = 0, 0, None, 0
+    try:
+        with conn.cursor(name=f"export_{os.path.basename(out_dir)}") as cur:
+            cur.itersize = FETCH_ROWS
+            cur.execute(query)
+            while True:
+                rows = cur.fetchmany(FETCH_ROWS)
+                if not rows:
+                    break
+                if writer is None:
+                    writer = pq.ParquetWriter(os.path.join(out_dir, f"part-{part:05d}.parquet"), schema,
+                                              compression="zstd")
+                writer.write_batch(_record_batch(rows, schema, dim))
+                total += len(rows)
+                part_count += len(rows)
+                if part_count >= part_rows:
+                    writer.close()
+                    writer, part_count = None, 0
+                    part += 1
+        conn.commit()
+    finally:
+        if writer is not None:
+            writer.close()
+    return total
+
+
+def export_corpus(out_dir=CORPUS_DIR, part_rows=PART_ROWS, dim=DIM):
+    """
+    Export cases and case_citations to a fresh corpus directory, replacing
+    the previous export only once the new one is complete
+    """
+    tmp_dir = out_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    start = time.perf_counter()
+
+    manifest = {
+        "exported_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "dim": dim,
+        "tables": {
+            "cases": export_table(CASES_QUERY, cases_schema(dim), os.path.join(tmp_dir, "cases"), part_rows, dim),
+            "case_citations": export_table(CITATIONS_QUERY, citations_schema(),
+                                           os.path.join(tmp_dir, "case_citations"), part_rows, dim),
+        },
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    old_dir = out_dir.rstrip(os.sep) + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    logging.info(f"Exported {manifest['tables']} to {out_dir} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+def _arrow_cache(corpus_dir, table):
+    """
+    Path of the table's uncompressed Arrow IPC file, rebuilt from the Parquet
+    parts when missing or older than them
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parts_dir = os.path.join(corpus_dir, table)
+    cache = os.path.join(corpus_dir, f"{table}.arrow")
+    parts = sorted(os.path.join(parts_dir, name) for name in os.listdir(parts_dir) if name.endswith(".parquet"))
+    newest = max((os.path.getmtime(p) for p in parts), default=0)
+    if os.path.exists(cache) and os.path.getmtime(cache) >= newest:
+        return cache
+
+    # One chunk per column, so vectors map to a single contiguous buffer
+    data = pq.ParquetDataset(parts).read().combine_chunks() if parts else None
+    if data is None:
+        schema = cases_schema() if table == "cases" else citations_schema()
+        data = schema.empty_table()
+    tmp = cache + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, data.schema) as writer:
+        writer.write_table(data, max_chunksize=max(data.num_rows, 1))
+    os.replace(tmp, cache)
+    return cache
+
+
+def load_table(corpus_dir=CORPUS_DIR, table="cases"):
+    """
+    Memory-mapped, zero-copy pyarrow Table for one exported table
+    """
+    import pyarrow as pa
+
+    source = pa.memory_map(_arrow_cache(corpus_dir, table), "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def load_corpus(corpus_dir=CORPUS_DIR):
+    """
+    Both exported tables as {"cases": Table, "case_citations": Table}
+    """
+    return {table: load_table(corpus_dir, table) for table in ("cases", "case_citations")}
+
+
+def case_vectors(cases):
+    """
+    (rows, dim) float32 view of the keyword vectors without copying.
+    Rows without a vector hold no meaningful values; check cases["keyword_vectors"].is_valid().
+    """
+    column = cases.column("keyword_vectors")
+    if column.num_chunks != 1:
+        column = column.combine_chunks()
+    else:
+        column = column.chunk(0)
+    dim = column.type.list_size
+    # Read the value buffer directly: missing vectors make the child array
+    # nullable, which to_numpy() would refuse to view without copying
+    values = column.values
+    data = np.frombuffer(values.buffers()[1], dtype=np.float32)[values.offset:]
+    return data[column.offset * dim:(column.offset + len(column)) * dim].reshape(-1, dim)
+
+
+def snapshot_rows(cases):
+    """
+    Rows in write_snapshot's order for every case that has a vector
+    """
+    vectors = case_vectors(cases)
+    valid = cases.column("keyword_vectors").is_valid().to_numpy(zero_copy_only=False)
+    columns = {name: cases.column(name).to_pylist() for name in ("case_id", "case_name", "court", "date", "url", "summary")}
+    for i in np.flatnonzero(valid):
+        yield (columns["case_id"][i], columns["case_name"][i], columns["court"][i], columns["date"][i],
+               columns["url"][i], columns["summary"][i], vectors[i])
+
+
+def build_snapshot_from_corpus(corpus_dir=CORPUS_DIR, path=SNAPSHOT_PATH):
+    """
+    Bootstrap the local search snapshot from an export instead of the database
+    """
+    cases = load_table(corpus_dir, "cases")
+    return write_snapshot(snapshot_rows(cases), path, case_vectors(cases).shape[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "snapshot", "load"])
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    parser.add_argument("--part-rows", type=int, default=PART_ROWS)
+    parser.add_argument("--snapshot", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_corpus(args.corpus, args.part_rows)
+    elif args.command == "snapshot":
+        build_snapshot_from_corpus(args.corpus, args.snapshot)
+    else:
+        start = time.perf_counter()
+        corpus = load_corpus(args.corpus)
+        vectors = case_vectors(corpus["cases"])
+        print(f"Loaded {corpus['cases'].num_rows} cases ({vectors.nbytes / 1e6:.0f} MB of vectors) and "
+              f"{corpus['case_citations'].num_rows} citations in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
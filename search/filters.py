@@ -0,0 +1,93 @@
+"""Per-court and per-year bitmap indexes over a case snapshot."""
+import datetime
+import threading
+import numpy as np
+from search.snapshot import NO_DATE, date_to_days
+
+
+class BitmapIndex:
+    """
+    Precomputed boolean masks, one per court and one per judgment year, that
+    combine with AND/OR to restrict the candidate rows before scoring.
+    """
+
+    def __init__(self, snapshot):
+        self.rows = len(snapshot)
+        self.dates = np.asarray(snapshot.dates)
+        courts = np.asarray(snapshot.courts)
+        self.courts = {name: courts == code for code, name in enumerate(snapshot.court_names)}
+
+        dated = self.dates != NO_DATE
+        years = np.full(self.rows, -1, dtype=np.int32)
+        years[dated] = self.dates[dated].astype("datetime64[D]").astype("datetime64[Y]").astype(np.int32) + 1970
+        self.years = {int(year): years == year for year in np.unique(years[dated])}
+
+    def court_mask(self, courts):
+        """
+        OR of the bitmaps for the given courts
+        """
+        mask = np.zeros(self.rows, dtype=bool)
+        for court in courts:
+            if court in self.courts:
+                mask |= self.courts[court]
+        return mask
+
+    def date_mask(self, date_from=None, date_to=None):
+        """
+        Rows dated within [date_from, date_to]. Whole years come straight from
+        the year bitmaps; only the two boundary years compare actual dates.
+        """
+        first = date_to_days(date_from) if date_from else None
+        last = date_to_days(date_to) if date_to else None
+        first_year = _year(date_from) if date_from else min(self.years, default=0)
+        last_year = _year(date_to) if date_to else max(self.years, default=0)
+
+        mask = np.zeros(self.rows, dtype=bool)
+        for year, bitmap in self.years.items():
+            if first_year < year < last_year:
+                mask |= bitmap
+            elif year in (first_year, last_year):
+                in_range = bitmap.copy()
+                if first is not None:
+                    in_range &= self.dates >= first
+                if last is not None:
+                    in_range &= self.dates <= last
+                mask |= in_range
+        return mask
+
+    def mask(self, courts=None, date_from=None, date_to=None):
+        """
+        AND of the court and date restrictions, or None when unfiltered
+        """
+        mask = None
+        if courts:
+            mask = self.court_mask(courts)
+        if date_from or date_to:
+            dates = self.date_mask(date_from, date_to)
+            mask = dates if mask is None else mask & dates
+        return mask
+
+
+def _year(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.year
+    return int(str(value)[:4])
+
+
+_indexes = {}
+# Streamlit sessions and the service's io_pool threads share the cache
+_indexes_lock = threading.Lock()
+
+
+def bitmap_index(snapshot):
+    """
+    Bitmap index for a snapshot, built once per snapshot generation
+    """
+    key = (snapshot.path, snapshot.generation)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = BitmapIndex(snapshot)
+            _indexes.clear()
+            _indexes[key] = index
+    return index
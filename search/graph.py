@@ -0,0 +1,221 @@
+"""In-memory citation graph with CSR adjacency for related-case expansion."""
+import logging
+import numpy as np
+
+# Logging setup
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+def _build_csr(src, dst, n):
+    """
+    Build CSR arrays (int64 offsets, int32 neighbours) for edges src -> dst
+    """
+    order = np.argsort(src, kind="stable")
+    neighbors = dst[order].astype(np.int32)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+    return offsets, neighbors
+
+
+class CitationGraph:
+    """
+    Citing -> cited edges from case_citations held as two CSR matrices
+    (forward and reverse), with a case_id <-> int mapping and case names so
+    related cases can be shown without further database round trips.
+    """
+
+    def __init__(self, case_ids, citing, cited, names=None, urls=None):
+        self.case_ids = list(case_ids)
+        self.index = {case_id: i for i, case_id in enumerate(self.case_ids)}
+        self.names = names or {}
+        self.urls = urls or {}
+        n = len(self.case_ids)
+
+        # Drop duplicate edges and self citations
+        citing = np.asarray(citing, dtype=np.int64)
+        cited = np.asarray(cited, dtype=np.int64)
+        keys = np.unique(citing[citing != cited] * n + cited[citing != cited])
+        citing, cited = keys // n, keys % n
+
+        self.out_offsets, self.out_neighbors = _build_csr(citing, cited, n)
+        self.in_offsets, self.in_neighbors = _build_csr(cited, citing, n)
+        self.in_degree = np.diff(self.in_offsets).astype(np.int32)
+        self.out_degree = np.diff(self.out_offsets).astype(np.int32)
+
+    @classmethod
+    def from_edges(cls, edges, names=None, urls=None):
+        """
+        Build a graph from an iterable of (citing_case_id, cited_case_id)
+        """
+        index, case_ids, citing, cited = {}, [], [], []
+        for src, dst in edges:
+            for case_id in (src, dst):
+                if case_id not in index:
+                    index[case_id] = len(case_ids)
+                    case_ids.append(case_id)
+            citing.append(index[src])
+            cited.append(index[dst])
+        return cls(case_ids, citing, cited, names, urls)
+
+    def __len__(self):
+        return len(self.case_ids)
+
+    @property
+    def edge_count(self):
+        return len(self.out_neighbors)
+
+    def _out(self, i):
+        return self.out_neighbors[self.out_offsets[i]:self.out_offsets[i + 1]]
+
+    def _in(self, i):
+        return self.in_neighbors[self.in_offsets[i]:self.in_offsets[i + 1]]
+
+    def _ids(self, idx):
+        return [self.case_ids[i] for i in idx]
+
+    def cites(self, case_id):
+        """
+        Cases cited by `case_id`
+        """
+        i = self.index.get(case_id)
+        return [] if i is None else self._ids(self._out(i))
+
+    def cited_by(self, case_id):
+        """
+        Cases that cite `case_id`
+        """
+        i = self.index.get(case_id)
+        return [] if i is None else self._ids(self._in(i))
+
+    def cited_by_count(self, case_id):
+        i = self.index.get(case_id)
+        return 0 if i is None else int(self.in_degree[i])
+
+    def two_hop(self, case_id, direction="out"):
+        """
+        Cases two citation steps away (excluding the case and its direct neighbours).
+        direction "out" follows cites -> cites, "in" follows cited_by -> cited_by.
+        """
+        i = self.index.get(case_id)
+        if i is None:
+            return []
+        step = self._out if direction == "out" else self._in
+        first = step(i)
+        if len(first) == 0:
+            return []
+        second = np.unique(np.concatenate([step(j) for j in first]))
+        second = second[(second != i) & ~np.isin(second, first)]
+        return self._ids(second)
+
+    def _shared_neighbor_scores(self, i, first_step, second_step, degree):
+        """
+        Count paths i -> first_step -> second_step and normalise by the
+        geometric mean of degrees (cosine similarity of neighbour sets)
+        """
+        first = first_step(i)
+        if len(first) == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        reached = np.concatenate([second_step(j) for j in first])
+        candidates, counts = np.unique(reached[reached != i], return_counts=True)
+        scores = counts / np.sqrt(float(degree[i]) * degree[candidates])
+        return candidates, scores.astype(np.float32)
+
+    def _top(self, candidates, scores, k):
+        if len(candidates) > k:
+            keep = np.argpartition(-scores, k)[:k]
+            candidates, scores = candidates[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")
+        return [(self.case_ids[c], float(s)) for c, s in zip(candidates[order], scores[order])]
+
+    def co_citation(self, case_id, k=10):
+        """
+        Cases most often cited alongside `case_id` by the same judgments
+        """
+        i = self.index.get(case_id)
+        if i is None:
+            return []
+        return self._top(*self._shared_neighbor_scores(i, self._in, self._out, self.in_degree), k)
+
+    def bibliographic_coupling(self, case_id, k=10):
+        """
+        Cases that cite the most of the same authorities as `case_id`
+        """
+        i = self.index.get(case_id)
+        if i is None:
+            return []
+        return self._top(*self._shared_neighbor_scores(i, self._out, self._in, self.out_degree), k)
+
+    def related(self, case_id, k=5):
+        """
+        Related precedents: direct citations in either direction plus
+        co-citation and bibliographic coupling, best first
+        """
+        i = self.index.get(case_id)
+        if i is None:
+            return []
+        scores = {}
+        for j in np.concatenate([self._out(i), self._in(i)]):
+            scores[int(j)] = scores.get(int(j), 0.0) + 1.0
+        for first_step, second_step, degree in ((self._in, self._out, self.in_degree),
+                                                (self._out, self._in, self.out_degree)):
+            candidates, shared = self._shared_neighbor_scores(i, first_step, second_step, degree)
+            for j, s in zip(candidates.tolist(), shared.tolist()):
+                scores[j] = scores.get(j, 0.0) + s
+        best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        return [(self.case_ids[j], s) for j, s in best]
+
+    def nbytes(self):
+        """
+        Memory held by the adjacency arrays
+        """
+        arrays = (self.out_offsets, self.out_neighbors, self.in_offsets, self.in_neighbors,
+                  self.in_degree, self.out_degree)
+        return sum(a.nbytes for a in arrays)
+
+
+def rerank(results, graph, weight=0.02):
+    """
+    Nudge search results towards well-cited authorities. `similarity_score`
+    is a distance (lower is better), so the boost is subtracted for ordering
+    only; the displayed score is unchanged.
+    """
+    if graph is None or not results:
+        return results
+    max_degree = max(int(graph.in_degree.max()) if len(graph) else 0, 1)
+
+    def adjusted(result):
+        authority = np.log1p(graph.cited_by_count(result["case_id"])) / np.log1p(max_degree)
+        return float(result["similarity_score"]) - weight * authority
+
+    for result in results:
+        result["cited_by_count"] = graph.cited_by_count(result["case_id"])
+    return sorted(results, key=adjusted)
+
+
+def load_citation_graph():
+    """
+    Load all resolved citation edges and case names from the database
+    """
+    from db.connection import conn
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT case_id, case_name, url FROM cases;")
+        cases = cur.fetchall()
+        cur.execute("""
+            SELECT citing_case_id, cited_case_id
+            FROM case_citations
+            WHERE cited_case_id IS NOT NULL;
+        """)
+        edges = cur.fetchall()
+    conn.commit()
+
+    graph = CitationGraph.from_edges(
+        edges,
+        names={case_id: name for case_id, name, _ in cases},
+        urls={case_id: url for case_id, _, url in cases},
+    )
+    logging.info(f"Loaded citation graph: {len(graph)} cases, {graph.edge_count} edges, {graph.nbytes() / 1e6:.1f} MB")
+    return graph
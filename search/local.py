@@ -0,0 +1,54 @@
+"""Local vector search over a memory-mapped case snapshot."""
+import numpy as np
+from search.filters import bitmap_index
+from search.graph import rerank
+
+
+def top_k(scores, k):
+    """
+    Indices of the k highest scores, best first
+    """
+    if len(scores) > k:
+        top = np.argpartition(-scores, k)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def rank_rows(snapshot, embedding, courts=None, date_from=None, date_to=None, limit=10, after=None):
+    """
+    (row, distance) for the closest `limit` snapshot rows, ordered by
+    (distance, case_id). Court and date filters are resolved to a candidate
+    set with bitmap indexes first, so only matching rows are scored. `after`
+    is the (distance, case_id) of the last row already seen.
+    """
+    query = np.asarray(embedding, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+
+    mask = bitmap_index(snapshot).mask(courts, date_from, date_to)
+    candidates = np.arange(len(snapshot)) if mask is None else np.flatnonzero(mask)
+    if len(candidates) == 0:
+        return []
+    distances = 1.0 - (snapshot.vectors if mask is None else snapshot.vectors[candidates]) @ query
+
+    if after is not None:
+        after_distance, after_case_id = np.float32(after[0]), after[1]
+        keep = distances > after_distance
+        #Only exact ties need the case id comparison
+        for i in np.flatnonzero(distances == after_distance):
+            keep[i] = snapshot.case_id(int(candidates[i])) > after_case_id
+        candidates, distances = candidates[keep], distances[keep]
+
+    rows = top_k(-distances, limit)
+    hits = [(int(candidates[i]), float(distances[i])) for i in rows]
+    return sorted(hits, key=lambda hit: (hit[1], snapshot.case_id(hit[0])))
+
+
+def search_cases(snapshot, embedding, courts=None, date_from=None, date_to=None, limit=10, graph=None):
+    """
+    Find similar cases in the snapshot. Returns results shaped like
+    db.check.fetch_cases, with `similarity_score` as cosine distance.
+    """
+    hits = rank_rows(snapshot, embedding, courts, date_from, date_to, limit)
+    results = [snapshot.record(i, distance) for i, distance in hits]
+    return rerank(results, graph) if graph is not None else results
@@ -0,0 +1,256 @@
+"""
+Precomputed nearest neighbours of every case, for "similar cases" lookups.
+
+    python -m search.neighbors                     # rebuild the snapshot, then add new cases' neighbours
+    python -m search.neighbors --full              # recompute every case's neighbours
+    python -m search.neighbors --reuse-snapshot    # use the existing snapshot as is
+
+Scores are blocked matrix products over the snapshot's normalised keyword
+vectors, so memory stays at one BLOCK_ROWS x BLOCK_COLS tile of scores.
+Each case's NEIGHBOR_K closest cases are stored as one case_neighbors row,
+leaving out near-duplicate copies of the same judgment (cases.duplicate_of).
+An incremental run scores only new or re-embedded cases against the corpus
+and merges them into the stored lists they now belong to; lists that lose
+a neighbour to a deleted, re-embedded or near-duplicate case are only
+exact again after the next --full run.
+"""
+import os
+import hashlib
+import argparse
+import logging
+import numpy as np
+from search.snapshot import SNAPSHOT_PATH, Snapshot, build_snapshot
+
+# Logging setup
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+NEIGHBOR_K = int(os.environ.get("NEIGHBOR_K", 10))
+BLOCK_ROWS = 1024
+BLOCK_COLS = 8192
+WRITE_PAGE = 500
+
+
+def ensure_neighbor_table():
+    """
+    Create the case_neighbors table if it does not exist yet
+    """
+    from db.connection import conn
+
+    with conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS case_neighbors (
+            case_id TEXT PRIMARY KEY,
+            neighbor_ids TEXT[] NOT NULL,
+            distances REAL[] NOT NULL,
+            vector_hash BIGINT,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """)
+    conn.commit()
+
+
+def vector_hash(vector):
+    """
+    Signed 64-bit hash of a vector's float32 bytes, to spot re-embedded cases
+    """
+    digest = hashlib.blake2b(np.asarray(vector, dtype=np.float32).tobytes(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def merge_top_k(scores, indices, k=NEIGHBOR_K):
+    """
+    The `k` best (score, index) pairs of each row, best first
+    """
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, part, axis=1)
+        indices = np.take_along_axis(indices, part, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+def duplicate_groups(ids):
+    """
+    Group label per snapshot row: near-duplicate judgments share the label of
+    their canonical case, every other row has its own
+    """
+    from db.connection import conn
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT case_id, duplicate_of FROM cases WHERE duplicate_of IS NOT NULL;")
+        canonical = dict(cur.fetchall())
+    conn.commit()
+
+    position = {case_id: i for i, case_id in enumerate(ids)}
+    groups = np.arange(len(ids), dtype=np.int64)
+    # Canonical cases missing from the snapshot get labels past the last row
+    absent = {}
+    for case_id, original in canonical.items():
+        if case_id in position:
+            label = position.get(original)
+            if label is None:
+                label = absent.setdefault(original, len(ids) + len(absent))
+            groups[position[case_id]] = label
+    return groups
+
+
+def top_neighbors(vectors, rows, columns=None, k=NEIGHBOR_K, groups=None):
+    """
+    Cosine scores and row indices of the `k` closest `columns` (default: all
+    rows) to each of `rows`, best first, never including the row itself or,
+    with `groups` (a label per row), rows in its near-duplicate group.
+    Missing neighbours are padded with -inf and -1.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    whole = columns is None
+    columns = np.arange(len(vectors)) if whole else np.asarray(columns, dtype=np.int64)
+    groups = np.arange(len(vectors), dtype=np.int64) if groups is None else np.asarray(groups)
+    scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+    indices = np.full((len(rows), k), -1, dtype=np.int64)
+
+    for start in range(0, len(rows), BLOCK_ROWS):
+        block = rows[start:start + BLOCK_ROWS]
+        queries = np.asarray(vectors[block], dtype=np.float32)
+        best_scores, best_indices = scores[start:start + len(block)], indices[start:start + len(block)]
+        for col_start in range(0, len(columns), BLOCK_COLS):
+            candidates = columns[col_start:col_start + BLOCK_COLS]
+            #Whole-corpus tiles are slices of the mapping, not copies
+            tile_vectors = vectors[col_start:col_start + len(candidates)] if whole else vectors[candidates]
+            tile = queries @ np.asarray(tile_vectors, dtype=np.float32).T
+            #Copies of the same judgment share an embedding; they are not "similar cases"
+            tile[groups[block][:, None] == groups[candidates][None, :]] = -np.inf
+            best_scores, best_indices = merge_top_k(
+                np.hstack([best_scores, tile]),
+                np.hstack([best_indices, np.broadcast_to(candidates, tile.shape)]), k)
+        scores[start:start + len(block)], indices[start:start + len(block)] = best_scores, best_indices
+    return scores, indices
+
+
+def load_neighbors(itersize=5000):
+    """
+    Stored neighbour lists: case_id -> (neighbor_ids, distances, vector_hash)
+    """
+    from db.connection import conn
+
+    stored = {}
+    with conn.cursor(name="case_neighbors") as cur:
+        cur.itersize = itersize
+        cur.execute("SELECT case_id, neighbor_ids, distances, vector_hash FROM case_neighbors;")
+        for case_id, neighbor_ids, distances, hashed in cur:
+            stored[case_id] = (neighbor_ids, distances, hashed)
+    conn.commit()
+    return stored
+
+
+def write_neighbors(rows, removed=()):
+    """
+    Upsert (case_id, neighbor_ids, distances, vector_hash) rows and delete
+    the lists of cases no longer in the corpus
+    """
+    from psycopg2.extras import execute_values
+    from db.connection import conn
+
+    with conn.cursor() as cur:
+        if removed:
+            cur.execute("DELETE FROM case_neighbors WHERE case_id = ANY(%s);", (list(removed),))
+        for start in range(0, len(rows), WRITE_PAGE):
+            execute_values(cur, """
+            INSERT INTO case_neighbors (case_id, neighbor_ids, distances, vector_hash) VALUES %s
+            ON CONFLICT (case_id) DO UPDATE
+            SET neighbor_ids = EXCLUDED.neighbor_ids, distances = EXCLUDED.distances,
+                vector_hash = EXCLUDED.vector_hash, updated_at = now();
+            """, rows[start:start + WRITE_PAGE])
+    conn.commit()
+
+
+def update_neighbors(snapshot, full=False, k=NEIGHBOR_K):
+    """
+    Bring case_neighbors up to date with the snapshot. Returns the number of
+    neighbour lists written.
+    """
+    ensure_neighbor_table()
+    n = len(snapshot)
+    ids = [snapshot.case_id(i) for i in range(n)]
+    position = {case_id: i for i, case_id in enumerate(ids)}
+    hashes = [vector_hash(snapshot.vectors[i]) for i in range(n)]
+    groups = duplicate_groups(ids)
+    stored = {} if full else load_neighbors()
+
+    fresh = [i for i, case_id in enumerate(ids) if case_id not in stored or stored[case_id][2] != hashes[i]]
+    removed = [case_id for case_id in stored if case_id not in position]
+    logging.info(f"{len(fresh)} of {n} cases need neighbours; {len(removed)} removed")
+
+    # New and re-embedded cases against the whole corpus
+    scores, indices = top_neighbors(snapshot.vectors, fresh, k=k, groups=groups)
+    updates = dict(zip(fresh, zip(scores, indices)))
+
+    # Existing lists that one of those cases now belongs to, or that lost a neighbour
+    is_fresh = np.zeros(n, dtype=bool)
+    is_fresh[fresh] = True
+    existing = np.flatnonzero(~is_fresh)
+    if len(existing):
+        current_scores = np.full((len(existing), k), -np.inf, dtype=np.float32)
+        current_indices = np.full((len(existing), k), -1, dtype=np.int64)
+        dirty = np.zeros(len(existing), dtype=bool)
+        for r, i in enumerate(existing):
+            neighbor_ids, distances, _ = stored[ids[i]]
+            #Drop deleted cases, re-embedded ones (scored again below) and copies of this judgment
+            kept = [(position[c], 1.0 - d) for c, d in zip(neighbor_ids, distances)
+                    if c in position and not is_fresh[position[c]] and groups[position[c]] != groups[i]][:k]
+            dirty[r] = len(kept) != len(neighbor_ids)
+            if kept:
+                current_indices[r, :len(kept)], current_scores[r, :len(kept)] = zip(*kept)
+
+        merged_scores, merged_indices = current_scores, current_indices
+        if fresh:
+            new_scores, new_indices = top_neighbors(snapshot.vectors, existing, fresh, k, groups)
+            merged_scores, merged_indices = merge_top_k(np.hstack([current_scores, new_scores]),
+                                                        np.hstack([current_indices, new_indices]), k)
+        for r in np.flatnonzero(dirty | (merged_indices != current_indices).any(axis=1)):
+            updates[int(existing[r])] = (merged_scores[r], merged_indices[r])
+
+    rows = []
+    for i, (row_scores, row_indices) in updates.items():
+        found = (row_indices >= 0) & np.isfinite(row_scores)
+        rows.append((ids[i], [ids[j] for j in row_indices[found]],
+                     [float(1.0 - s) for s in row_scores[found]], hashes[i]))
+    write_neighbors(rows, removed)
+    logging.info(f"Wrote {len(rows)} neighbour lists")
+    return len(rows)
+
+
+def similar_cases(case_id):
+    """
+    The stored neighbours of a case, hydrated for display, closest first
+    """
+    import db.check as db
+    from db.users_connection import anon_supabase
+
+    response = anon_supabase.table("case_neighbors").select("neighbor_ids, distances") \
+        .eq("case_id", case_id).execute()
+    if not response.data:
+        return []
+    row = response.data[0]
+    return db.hydrate_cases([{"case_id": neighbor, "similarity_score": distance}
+                             for neighbor, distance in zip(row["neighbor_ids"], row["distances"])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="recompute every case instead of only new ones")
+    parser.add_argument("--snapshot", default=SNAPSHOT_PATH)
+    parser.add_argument("--reuse-snapshot", action="store_true",
+                        help="use the snapshot at --snapshot instead of rebuilding it from the database")
+    parser.add_argument("-k", type=int, default=NEIGHBOR_K)
+    args = parser.parse_args()
+
+    if not (args.reuse_snapshot and os.path.exists(args.snapshot)):
+        build_snapshot(args.snapshot)
+    update_neighbors(Snapshot(args.snapshot), args.full, args.k)
+
+
+if __name__ == "__main__":
+    main()
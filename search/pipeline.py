@@ -0,0 +1,253 @@
+"""The search pipeline behind app.py: redact, extract keywords, embed, search, log."""
+import json
+import uuid
+import base64
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import utils.genai as llm
+import db.check as db
+from db.fingerprints import collapse_near_duplicates
+from db.fill_query import log_search_transaction, log_result_page
+from search.local import rank_rows
+
+# Extra candidates fetched so collapsing near-duplicates still fills the page
+DUPLICATE_HEADROOM = 5
+# Near-duplicates share their canonical case's embedding, so only groups shown
+# this close to the end of a page can turn up again on the next one
+DUPLICATE_WINDOW = 0.01
+MAX_SEEN_GROUPS = 50
+# Runs Gemini keyword extraction alongside speculative searches
+keyword_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="keywords")
+
+
+def extract_keywords(user_input, nlp, gemini):
+    """
+    Redact the user's input and extract keywords with Gemini,
+    falling back to the redacted input
+    """
+    redacted_input = llm.filter_input(user_input, nlp)
+    keywords = (llm.extract_user_keywords(redacted_input, gemini) or redacted_input).strip()
+    return redacted_input, keywords
+
+
+def embed(text, embedding_model):
+    """
+    Embed text and L2-normalise it, as match_cases expects
+    """
+    embedding = np.asarray(llm.generate_embeddings(text, embedding_model), dtype=np.float32)
+    return embedding / np.linalg.norm(embedding)
+
+
+def encode_cursor(state):
+    """
+    Opaque, URL-safe token for a page position (see find_page)
+    """
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """
+    Page position from a token made by encode_cursor; ValueError if it is malformed
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        state["after"] = tuple(state["after"]) if state["after"] else None
+        return state
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise ValueError("Invalid search cursor") from e
+
+
+def find_page(embedding, courts=None, date_from=None, date_to=None, graph=None, snapshot=None, limit=10,
+              cursor=None):
+    """
+    One page of results from the local snapshot when there is one, otherwise
+    the match_case_ids RPC. Candidates are ranked by id and distance alone;
+    only the cases on the page are hydrated with their names and summaries.
+    Near-duplicate judgments are collapsed to their best-ranked copy, across
+    pages too: the cursor keeps the groups shown within DUPLICATE_WINDOW of its
+    end. With a cursor the filters are taken from it and the page picks up
+    after the last result of the previous one.
+    Returns (results, first_rank, next_cursor); next_cursor is None at the end.
+    """
+    if cursor:
+        state = decode_cursor(cursor)
+    else:
+        state = {"courts": list(courts or []), "date_from": str(date_from) if date_from else None,
+                 "date_to": str(date_to) if date_to else None, "after": None, "shown": 0, "seen": []}
+    courts, date_from, date_to = state["courts"], state["date_from"], state["date_to"]
+    seen = {group: distance for group, distance in state["seen"]}
+    first_rank = state["shown"] + 1
+
+    after, fetch, page = state["after"], limit + DUPLICATE_HEADROOM, []
+    while True:
+        if snapshot is not None:
+            candidates = [{"case_id": snapshot.case_id(i), "similarity_score": distance, "row": i}
+                          for i, distance in rank_rows(snapshot, embedding, courts, date_from, date_to, fetch, after)]
+        else:
+            candidates = db.match_case_ids(embedding, courts or "Any", fetch, after)
+        page += collapse_near_duplicates(candidates, limit - len(page), seen)
+        exhausted = len(candidates) < fetch
+        if len(page) >= limit or exhausted:
+            break
+        #A whole batch of duplicates: keep reading past it
+        after = (candidates[-1]["similarity_score"], candidates[-1]["case_id"])
+
+    next_cursor = None
+    if page and not (exhausted and page[-1] is candidates[-1]):
+        last = (page[-1]["similarity_score"], page[-1]["case_id"])
+        window = [(group, distance) for group, distance in seen.items()
+                  if distance >= last[0] - DUPLICATE_WINDOW]
+        state.update(after=last, shown=state["shown"] + len(page),
+                     seen=sorted(window, key=lambda g: g[1])[-MAX_SEEN_GROUPS:])
+        next_cursor = encode_cursor(state)
+
+    if snapshot is not None:
+        results = [snapshot.record(res["row"], res["similarity_score"]) for res in page]
+    else:
+        results = db.hydrate_cases(page)
+    if graph is not None:
+        from search.graph import rerank
+        results = rerank(results, graph)
+    return results, first_rank, next_cursor
+
+
+def find_cases(embedding, courts=None, date_from=None, date_to=None, graph=None, snapshot=None, limit=10):
+    """
+    First page of find_page, without the cursor
+    """
+    return find_page(embedding, courts, date_from, date_to, graph, snapshot, limit)[0]
+
+
+def build_query_info(session_id, user_input, keywords, embedding, query_id=None):
+    """
+    Row for the queries table
+    """
+    return {
+        "session_id": session_id,
+        "query_text": user_input,
+        "extracted_keywords": {"keywords": keywords},
+        "query_embedding": np.asarray(embedding).tolist(),
+        "query_id": query_id or str(uuid.uuid4()),
+    }
+
+
+def build_result_rows(results, query_id, first_rank=1):
+    """
+    Rows for the query_results table, also used to render result cards
+    """
+    return [
+        {
+            "case_id": res["case_id"],
+            "name": res["case_name"],
+            "court": res["court"],
+            "url": res["url"],
+            "summary": res["summary"],
+            "similarity_score": res["similarity_score"],
+            "query_id": query_id,
+            "rank": first_rank + i,
+            "feedback_score": None,
+            "query_result_id": str(uuid.uuid4())
+        }
+        for i, res in enumerate(results)
+    ]
+
+
+def search_page(query_info, cursor=None, courts=None, date_from=None, date_to=None, graph=None,
+                snapshot=None, limit=10, log=True):
+    """
+    Result rows for one page of an already embedded query, logged under its
+    query_id. The first page (no cursor) logs the query too; later pages reuse
+    the stored embedding and only add their result rows.
+    Returns (result_rows, next_cursor).
+    """
+    results, first_rank, next_cursor = find_page(query_info["query_embedding"], courts, date_from, date_to,
+                                                 graph, snapshot, limit, cursor)
+    rows = build_result_rows(results, query_info["query_id"], first_rank)
+    if log and cursor:
+        log_result_page(rows)
+    elif log:
+        log_search_transaction(query_info, rows)
+    return rows, next_cursor
+
+
+def run_search(user_input, session_id, nlp, gemini, embedding_model, courts=None, date_from=None,
+               date_to=None, graph=None, snapshot=None, limit=10, log=True):
+    """
+    Run the whole search for one query and log it.
+    Returns (keywords, query_info, result_rows, next_cursor).
+    """
+    _, keywords = extract_keywords(user_input, nlp, gemini)
+    embedding = embed(keywords, embedding_model)
+    query_info = build_query_info(session_id, user_input, keywords, embedding)
+    rows, next_cursor = search_page(query_info, None, courts, date_from, date_to, graph, snapshot, limit, log)
+    return keywords, query_info, rows, next_cursor
+
+
+def speculative_search(user_input, nlp, gemini, embedding_model, courts=None, date_from=None,
+                       date_to=None, graph=None, snapshot=None, limit=10, wait_interval=0.5):
+    """
+    Start Gemini keyword extraction in the background and immediately search
+    with the redacted input itself. Yields ("provisional", None, embedding, results, None)
+    as soon as that local search is done, ("waiting", ...) with the same values every
+    `wait_interval` seconds while Gemini is still working, then ("final", keywords,
+    embedding, results, next_cursor) from the keyword embedding, exactly as run_search
+    would return them. Closing the generator early cancels the pending extraction
+    if it has not started yet.
+    """
+    redacted_input = llm.filter_input(user_input, nlp)
+    keywords_future = keyword_pool.submit(llm.extract_user_keywords, redacted_input, gemini)
+    try:
+        provisional_embedding = embed(redacted_input, embedding_model)
+        provisional = find_cases(provisional_embedding, courts, date_from, date_to, graph, snapshot, limit)
+        yield "provisional", None, provisional_embedding, provisional, None
+
+        # Hand control back regularly so the caller can abandon a superseded query
+        while True:
+            try:
+                keywords = keywords_future.result(timeout=wait_interval)
+                break
+            except TimeoutError:
+                yield "waiting", None, provisional_embedding, provisional, None
+        keywords = (keywords or redacted_input).strip()
+    finally:
+        keywords_future.cancel()
+
+    embedding = embed(keywords, embedding_model)
+    results, _, next_cursor = find_page(embedding, courts, date_from, date_to, graph, snapshot, limit)
+    yield "final", keywords, embedding, results, next_cursor
+
+
+def run_search_remote(service_url, user_input, session_id, courts=None, date_from=None, date_to=None,
+                      limit=10, timeout=60):
+    """
+    Same as run_search, executed by the headless search service (service.py)
+    """
+    import requests
+
+    response = requests.post(f"{service_url.rstrip('/')}/search", json={
+        "query": user_input,
+        "session_id": session_id,
+        "courts": list(courts or []),
+        "date_from": str(date_from) if date_from else None,
+        "date_to": str(date_to) if date_to else None,
+        "limit": limit,
+    }, timeout=timeout)
+    response.raise_for_status()
+    body = response.json()
+    return body["keywords"], body["query_info"], body["results"], body.get("next_cursor")
+
+
+def search_page_remote(service_url, query_info, cursor, limit=10, timeout=60):
+    """
+    Same as search_page for a later page, executed by the headless search service
+    """
+    import requests
+
+    response = requests.post(f"{service_url.rstrip('/')}/search/more", json={
+        "query_info": query_info,
+        "cursor": cursor,
+        "limit": limit,
+    }, timeout=timeout)
+    response.raise_for_status()
+    body = response.json()
+    return body["results"], body.get("next_cursor")
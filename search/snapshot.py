@@ -0,0 +1,287 @@
+"""
+Read-only snapshot of the cases table for local search.
+
+Layout: a 16 byte preamble (magic, format version, header length), a JSON
+header describing each section, then 64 byte aligned sections:
+float32 vectors, int16 court codes, int32 dates (days since epoch) and
+offsets-indexed UTF-8 blobs for case ids, names, urls and summaries.
+Processes np.memmap the file read-only so its pages are shared between them.
+"""
+import os
+import json
+import struct
+import shutil
+import tempfile
+import time
+import datetime
+import logging
+import numpy as np
+
+# Logging setup
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+MAGIC = b"PRECSNAP"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+ALIGN = 64
+DIM = 384
+NO_DATE = np.iinfo(np.int32).min
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", os.path.join("snapshots", "cases.snap"))
+TEXT_COLUMNS = ["case_id", "case_name", "url", "summary"]
+
+
+def parse_vector(value):
+    """
+    Convert a pgvector value (text like "[0.1,0.2]" or a list) to float32
+    """
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def date_to_days(value):
+    """
+    Convert a date, datetime or ISO string to days since 1970-01-01, or NO_DATE
+    """
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return (value - datetime.date(1970, 1, 1)).days
+    try:
+        return int(np.datetime64(str(value)[:10], "D").astype(np.int64))
+    except (ValueError, TypeError):
+        return NO_DATE
+
+
+def _aligned(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def read_header(path):
+    """
+    Read and validate the snapshot header
+    """
+    with open(path, "rb") as f:
+        magic, version, header_len = PREAMBLE.unpack(f.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a case snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format version {version} (expected {FORMAT_VERSION})")
+        return json.loads(f.read(header_len))
+
+
+def write_snapshot(rows, path=SNAPSHOT_PATH, dim=DIM):
+    """
+    Write a snapshot from an iterable of
+    (case_id, case_name, court, date, url, summary, vector) rows.
+    Sections are spooled to temporary files so memory stays flat, and the
+    finished file replaces `path` atomically.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    try:
+        generation = read_header(path)["generation"] + 1
+    except (OSError, ValueError, KeyError):
+        generation = 1
+
+    courts = {}
+    offsets = {column: [0] for column in TEXT_COLUMNS}
+    court_codes, dates = [], []
+    n = 0
+
+    with tempfile.TemporaryDirectory(dir=directory) as spool:
+        spools = {name: open(os.path.join(spool, name), "wb") for name in ["vectors"] + TEXT_COLUMNS}
+        for case_id, case_name, court, date, url, summary, vector in rows:
+            vector = parse_vector(vector)
+            if vector.shape != (dim,):
+                logging.warning(f"Skipping {case_id}: vector has shape {vector.shape}")
+                continue
+            norm = np.linalg.norm(vector)
+            spools["vectors"].write((vector / norm if norm else vector).tobytes())
+
+            for column, value in zip(TEXT_COLUMNS, (case_id, case_name, url, summary)):
+                encoded = (value or "").encode("utf-8")
+                spools[column].write(encoded)
+                offsets[column].append(offsets[column][-1] + len(encoded))
+
+            court_codes.append(courts.setdefault(court or "Unknown", len(courts)))
+            dates.append(date_to_days(date))
+            n += 1
+        for f in spools.values():
+            f.close()
+
+        arrays = {
+            "court": np.asarray(court_codes, dtype=np.int16),
+            "date": np.asarray(dates, dtype=np.int32),
+        }
+        for column in TEXT_COLUMNS:
+            arrays[f"{column}_offsets"] = np.asarray(offsets[column], dtype=np.int64)
+
+        # Lay out sections after the header
+        layout = [("vectors", "float32", [n, dim], os.path.join(spool, "vectors"))]
+        layout += [(name, str(a.dtype), list(a.shape), a) for name, a in arrays.items()]
+        layout += [(f"{c}_blob", "uint8", [offsets[c][-1]], os.path.join(spool, c)) for c in TEXT_COLUMNS]
+
+        header = {
+            "format_version": FORMAT_VERSION,
+            "generation": generation,
+            "built_at": time.time(),
+            "rows": n,
+            "dim": dim,
+            "courts": sorted(courts, key=courts.get),
+            "sections": {},
+        }
+        # Section offsets depend on the header length, so size it with placeholders first
+        header["sections"] = {name: {"offset": 0, "dtype": dtype, "shape": shape}
+                              for name, dtype, shape, _ in layout}
+        data_start = _aligned(PREAMBLE.size + len(json.dumps(header)) + 32 * len(layout))
+        position = data_start
+        for name, dtype, shape, _ in layout:
+            header["sections"][name]["offset"] = position
+            position = _aligned(position + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        header_bytes = json.dumps(header).encode("utf-8")
+        assert PREAMBLE.size + len(header_bytes) <= data_start
+
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "wb") as out:
+            out.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            out.write(header_bytes)
+            for name, _, _, source in layout:
+                out.seek(header["sections"][name]["offset"])
+                if isinstance(source, np.ndarray):
+                    out.write(source.tobytes())
+                else:
+                    with open(source, "rb") as f:
+                        shutil.copyfileobj(f, out)
+            out.truncate(position)
+            out.flush()
+            os.fsync(out.fileno())
+
+    # Readers holding the old file keep their mapping; new opens see the new one
+    os.replace(tmp_path, path)
+    logging.info(f"Wrote snapshot generation {generation} with {n} cases to {path}")
+    return path
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped view of a snapshot file. Arrays are views into
+    one shared mapping, so opening a snapshot costs no copies.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self.header = read_header(path)
+        stat = os.stat(path)
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+        self.generation = self.header["generation"]
+        self.rows = self.header["rows"]
+        self.dim = self.header["dim"]
+        self.court_names = self.header["courts"]
+
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+        self.sections = {}
+        for name, section in self.header["sections"].items():
+            dtype = np.dtype(section["dtype"])
+            count = int(np.prod(section["shape"]))
+            start = section["offset"]
+            view = self._map[start:start + count * dtype.itemsize].view(dtype)
+            self.sections[name] = view.reshape(section["shape"])
+
+        self.vectors = self.sections["vectors"]
+        self.courts = self.sections["court"]
+        self.dates = self.sections["date"]
+
+    def __len__(self):
+        return self.rows
+
+    def text(self, column, i):
+        """
+        Decode row `i` of a text column (case_id, case_name, url or summary)
+        """
+        offsets = self.sections[f"{column}_offsets"]
+        return bytes(self.sections[f"{column}_blob"][offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def case_id(self, i):
+        return self.text("case_id", i)
+
+    def date(self, i):
+        days = int(self.dates[i])
+        return None if days == NO_DATE else str(np.datetime64(days, "D"))
+
+    def record(self, i, distance):
+        """
+        Row `i` in the same shape as db.check.fetch_cases results
+        """
+        return {
+            "case_id": self.case_id(i),
+            "case_name": self.text("case_name", i) or "Unknown",
+            "court": self.court_names[self.courts[i]],
+            "url": self.text("url", i) or "#",
+            "summary": self.text("summary", i) or "No summary available.",
+            "date": self.date(i),
+            "similarity_score": float(distance),
+        }
+
+    def is_stale(self):
+        """
+        True if a newer snapshot has been swapped in at `path`
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != self.identity
+
+
+_current = None
+_last_check = 0.0
+
+
+def current_snapshot(path=SNAPSHOT_PATH, check_every=30.0):
+    """
+    Process-wide snapshot, reopened when a refresh has swapped in a new file
+    """
+    global _current, _last_check
+    now = time.monotonic()
+    if _current is None or _current.path != path:
+        _current = Snapshot(path)
+        _last_check = now
+    elif now - _last_check >= check_every:
+        _last_check = now
+        if _current.is_stale():
+            _current = Snapshot(path)
+            logging.info(f"Swapped to snapshot generation {_current.generation}")
+    return _current
+
+
+def iter_case_rows(itersize=2000):
+    """
+    Stream snapshot rows from the cases table with a server-side cursor
+    """
+    from db.connection import conn
+
+    with conn.cursor(name="snapshot_cases") as cur:
+        cur.itersize = itersize
+        cur.execute("""
+            SELECT case_id, case_name, court, date, url, summary, keyword_vectors
+            FROM cases
+            WHERE keyword_vectors IS NOT NULL
+            ORDER BY case_id;
+        """)
+        yield from cur
+    conn.commit()
+
+
+def build_snapshot(path=SNAPSHOT_PATH):
+    """
+    Build a fresh snapshot from the cases table and swap it in
+    """
+    return write_snapshot(iter_case_rows(), path)
+
+
+if __name__ == "__main__":
+    build_snapshot()
@@ -0,0 +1,114 @@
+"""Prefix index over case names and neutral citations for known-item lookups."""
+import re
+import time
+import logging
+from bisect import bisect_left
+from utils.api import normalize_citation, parse_citation
+
+# Logging setup
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+MIN_QUERY_CHARS = 2
+APPLICANT_MARKER = "on the application of "
+
+
+def search_key(text):
+    """
+    Lower-case words joined by single spaces, punctuation dropped, so that
+    "[2023] EWHC 123 (Ch)" becomes "2023 ewhc 123 ch"
+    """
+    return " ".join(re.sub(r"[^\w]+", " ", normalize_citation(text or "").casefold()).split())
+
+
+def citation_keys(citation):
+    """
+    Keys for a neutral citation: as written, and court first for lookups
+    without the year ("ewca civ 123 2023")
+    """
+    parts = parse_citation(normalize_citation(citation or ""))
+    if parts is None:
+        return [search_key(citation)] if citation else []
+    tail = [parts["court"], parts["division"], parts["number"], parts["subdivision"]]
+    written = search_key(" ".join(p for p in [parts["year"]] + tail if p))
+    court_first = search_key(" ".join(p for p in tail + [parts["year"]] if p))
+    return [written, court_first]
+
+
+def name_keys(case_name):
+    """
+    Keys for a case name: the whole name, each party after " v ", and the
+    applicant in "R (on the application of X) v Y" names
+    """
+    name = search_key(case_name)
+    if not name:
+        return []
+    keys = [name]
+    for party in name.split(" v ")[1:]:
+        keys.append(party)
+    if APPLICANT_MARKER in name:
+        keys.append(name.split(APPLICANT_MARKER, 1)[1])
+    return keys
+
+
+class TypeaheadIndex:
+    """
+    Sorted array of (key, case) pairs; a lookup is one binary search for the
+    query's key plus a walk over the keys it prefixes
+    """
+
+    def __init__(self, rows):
+        """
+        `rows` are (case_id, case_name, neutral_citation, court, url) tuples
+        """
+        self.cases = []
+        pairs = []
+        for case_id, case_name, citation, court, url in rows:
+            row = len(self.cases)
+            self.cases.append({"case_id": case_id, "case_name": case_name or "Unknown",
+                               "neutral_citation": citation, "court": court or "Unknown", "url": url or "#"})
+            for key in set(citation_keys(citation) + name_keys(case_name)):
+                pairs.append((key, row))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.rows = [row for _, row in pairs]
+
+    def __len__(self):
+        return len(self.cases)
+
+    def lookup(self, query, limit=10):
+        """
+        Cases with a name, party or citation starting with `query`, in key order
+        (so an exact match comes before longer ones)
+        """
+        key = search_key(query)
+        if len(key) < MIN_QUERY_CHARS:
+            return []
+        found, seen = [], set()
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i].startswith(key) and len(found) < limit:
+            row = self.rows[i]
+            if row not in seen:
+                seen.add(row)
+                found.append(self.cases[row])
+            i += 1
+        return found
+
+
+def load_typeahead_index():
+    """
+    Build the index from the cases table
+    """
+    from db.connection import conn
+
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute("SELECT case_id, case_name, neutral_citation, court, url FROM cases;")
+        rows = cur.fetchall()
+    conn.commit()
+    index = TypeaheadIndex(rows)
+    logging.info(f"Typeahead index over {len(index)} cases, {len(index.keys)} keys "
+                 f"in {time.perf_counter() - start:.2f}s")
+    return index
@@ -0,0 +1,233 @@
+"""
+Headless asyncio search service wrapping the app.py pipeline.
+
+    python service.py            # listens on SERVICE_HOST:SERVICE_PORT
+
+POST /search       {"query", "session_id", "courts", "date_from", "date_to", "limit"}
+                   (date filters need a local snapshot; 400 without one)
+POST /search/more  {"query_info", "cursor", "limit"}   next page after a search's "next_cursor"
+POST /feedback     {"query_result_id", "feedback_score"}
+GET  /courts
+GET  /health
+"""
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from aiohttp import web
+import utils.genai as llm
+import db.check as db
+from db.fill_query import log_search_transaction, log_result_page, update_feedback_score
+import search.pipeline as pipeline
+from search.graph import load_citation_graph
+from search.snapshot import SNAPSHOT_PATH, current_snapshot
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+HOST = os.environ.get("SERVICE_HOST", "0.0.0.0")
+PORT = int(os.environ.get("SERVICE_PORT", 8080))
+IO_WORKERS = int(os.environ.get("SERVICE_IO_WORKERS", 32))
+BATCH_WINDOW_MS = float(os.environ.get("SERVICE_BATCH_WINDOW_MS", 5))
+MAX_BATCH = int(os.environ.get("SERVICE_MAX_BATCH", 64))
+# Reload the citation graph as often as app.py's cache does
+GRAPH_TTL_SECONDS = 3600
+# match_case_ids has no date predicate; only the snapshot's bitmaps can filter by date
+DATES_NEED_SNAPSHOT = "date_from and date_to need a local case snapshot (python -m search.snapshot)"
+
+
+class EmbeddingBatcher:
+    """
+    Merges concurrent requests' embedding calls. The first request opens a
+    window of `max_wait` seconds; everything queued by then (up to
+    `max_batch`) is encoded in one model call on the embedding thread.
+    """
+
+    def __init__(self, model, executor, max_batch=MAX_BATCH, max_wait=BATCH_WINDOW_MS / 1000):
+        self.model = model
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def encode(self, text):
+        """
+        Embed one text, sharing a model call with concurrent requests
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self.model.encode, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    vector = np.asarray(vector, dtype=np.float32)
+                    future.set_result(vector / np.linalg.norm(vector))
+
+
+async def citation_graph(app):
+    """
+    The citation graph results are reranked with, as in app.py; None if it
+    could not be loaded
+    """
+    if time.monotonic() - app["graph_loaded_at"] > GRAPH_TTL_SECONDS:
+        app["graph_loaded_at"] = time.monotonic()
+        try:
+            app["graph"] = await asyncio.get_running_loop().run_in_executor(app["db_pool"], load_citation_graph)
+        except Exception as e:
+            logger.error(f"Citation graph unavailable: {e}")
+            app["graph"] = None
+    return app["graph"]
+
+
+async def on_startup(app):
+    # One warm model pool for the whole service
+    app["nlp"] = llm.load_nlp()
+    app["gemini"] = llm.gemini_model()
+    app["embedding_model"] = llm.load_model()
+    app["embedding_model"].encode(["warm up"])
+
+    # Network-bound steps (Gemini, Supabase) share a wide pool; spaCy, the
+    # encoder and the single psycopg2 connection each get one thread.
+    app["io_pool"] = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+    app["nlp_pool"] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nlp")
+    app["embed_pool"] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+    app["db_pool"] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+    app["batcher"] = EmbeddingBatcher(app["embedding_model"], app["embed_pool"])
+    app["batcher"].start()
+
+    app["graph"], app["graph_loaded_at"] = None, float("-inf")
+    await citation_graph(app)
+    logger.info("Search service ready")
+
+
+async def on_cleanup(app):
+    await app["batcher"].stop()
+    for pool in ("io_pool", "nlp_pool", "embed_pool", "db_pool"):
+        app[pool].shutdown(wait=False)
+
+
+async def search(request):
+    app = request.app
+    loop = asyncio.get_running_loop()
+    body = await request.json()
+    user_input = (body.get("query") or "").strip()
+    if not user_input:
+        return web.json_response({"error": "query is required"}, status=400)
+    snapshot = current_snapshot() if os.path.exists(SNAPSHOT_PATH) else None
+    if snapshot is None and (body.get("date_from") or body.get("date_to")):
+        return web.json_response({"error": DATES_NEED_SNAPSHOT}, status=400)
+
+    redacted_input = await loop.run_in_executor(app["nlp_pool"], llm.filter_input, user_input, app["nlp"])
+    keywords = await loop.run_in_executor(app["io_pool"], llm.extract_user_keywords, redacted_input, app["gemini"])
+    keywords = (keywords or redacted_input).strip()
+
+    embedding = await app["batcher"].encode(keywords)
+
+    graph = await citation_graph(app)
+    results, _, next_cursor = await loop.run_in_executor(
+        app["io_pool"], pipeline.find_page, embedding, body.get("courts"), body.get("date_from"),
+        body.get("date_to"), graph, snapshot, int(body.get("limit", 10)))
+
+    query_info = pipeline.build_query_info(body.get("session_id"), user_input, keywords, embedding)
+    rows = pipeline.build_result_rows(results, query_info["query_id"])
+    await loop.run_in_executor(app["db_pool"], log_search_transaction, query_info, rows)
+
+    return web.json_response({"keywords": keywords, "query_info": query_info, "results": rows,
+                              "next_cursor": next_cursor})
+
+
+async def search_more(request):
+    app = request.app
+    loop = asyncio.get_running_loop()
+    body = await request.json()
+    query_info = body.get("query_info") or {}
+    if not body.get("cursor") or "query_embedding" not in query_info:
+        return web.json_response({"error": "cursor and query_info are required"}, status=400)
+
+    snapshot = current_snapshot() if os.path.exists(SNAPSHOT_PATH) else None
+    try:
+        state = pipeline.decode_cursor(body["cursor"])
+        if snapshot is None and (state.get("date_from") or state.get("date_to")):
+            return web.json_response({"error": DATES_NEED_SNAPSHOT}, status=400)
+        graph = await citation_graph(app)
+        results, first_rank, next_cursor = await loop.run_in_executor(
+            app["io_pool"], pipeline.find_page, query_info["query_embedding"], None, None, None, graph,
+            snapshot, int(body.get("limit", 10)), body["cursor"])
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    rows = pipeline.build_result_rows(results, query_info["query_id"], first_rank)
+    await loop.run_in_executor(app["db_pool"], log_result_page, rows)
+
+    return web.json_response({"results": rows, "next_cursor": next_cursor})
+
+
+async def feedback(request):
+    body = await request.json()
+    success = await asyncio.get_running_loop().run_in_executor(
+        request.app["db_pool"], update_feedback_score, body["query_result_id"], int(body["feedback_score"]))
+    return web.json_response({"success": success}, status=200 if success else 500)
+
+
+async def courts(request):
+    court_list = await asyncio.get_running_loop().run_in_executor(request.app["io_pool"], db.get_courts)
+    return web.json_response(court_list)
+
+
+async def health(request):
+    return web.json_response({"status": "ok"})
+
+
+def create_app():
+    app = web.Application()
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.add_routes([
+        web.post("/search", search),
+        web.post("/search/more", search_more),
+        web.post("/feedback", feedback),
+        web.get("/courts", courts),
+        web.get("/health", health),
+    ])
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host=HOST, port=PORT)
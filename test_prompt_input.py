@@ -0,0 +1,36 @@
+from lxml import etree
+from utils.api import parse_case_content
+from utils.prompt_input import build_prompt_input
+
+AKN = "http://docs.oasis-open.org/legaldocml/ns/akn/3.0"
+
+
+def _paragraph(number, text):
+    return f"<paragraph><num>{number}.</num><content><p>{text}</p></content></paragraph>"
+
+
+def _judgment(background, decision):
+    body = "".join(_paragraph(i, text) for i, text in enumerate(background, 1))
+    ruling = _paragraph(len(background) + 1, decision)
+    return etree.fromstring(
+        f'<akomaNtoso xmlns="{AKN}"><judgment><judgmentBody>'
+        f"{body}<decision>{ruling}</decision>"
+        f"</judgmentBody></judgment></akomaNtoso>".encode("utf-8")
+    )
+
+
+def test_decision_tag_survives_dedupe_into_the_numbered_paragraph():
+    """
+    The <decision> text fragments are also inside the numbered paragraphs;
+    the paragraph that absorbs a tagged fragment must rank as decision
+    """
+    background = [f"Background fact {i} about the tenancy, the deposit and the letters exchanged." for i in range(8)]
+    root = _judgment(background, "For these reasons the appeal is dismissed.")
+    content = parse_case_content(root)
+
+    prompt = build_prompt_input(content, budget=40)
+
+    decision, _, rest = prompt.partition("\n\nBackground:\n")
+    assert decision.startswith("Decision:\n")
+    assert "9. For these reasons the appeal is dismissed." in decision
+    assert "appeal is dismissed" not in rest
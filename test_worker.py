@@ -0,0 +1,63 @@
+import sys
+import types
+from benchmarks.fakes import FakeConnection, FakeSupabase, install_fakes
+
+install_fakes(FakeSupabase(cases=10, latency=0, jitter=0), FakeConnection(latency=0, jitter=0))
+
+import db.ingest_journal as journal
+import db.work_queue as queue
+import worker
+
+
+class _Heartbeat:
+    def __init__(self, worker_id):
+        self.finished_calls = []
+
+    def start(self):
+        pass
+
+    def working_on(self, case_id):
+        pass
+
+    def finished(self, ok):
+        self.finished_calls.append(ok)
+
+    def stop(self):
+        pass
+
+
+def test_successful_run_releases_case_as_done(monkeypatch):
+    """
+    A case that reaches the last journal stage goes back to the queue as 'done'
+    """
+    def ingest_case(case_id, title, date, court, xml_link, updated):
+        entry = {"case_id": case_id, "stage": "inserted", "status": "active", "attempts": 0,
+                 "next_attempt_at": None}
+        journal.record_stage(entry, journal.STAGES[-1])
+        return entry
+
+    fake_main = types.ModuleType("main")
+    fake_main.ensure_tables = lambda: None
+    fake_main.ingest_case = ingest_case
+    monkeypatch.setitem(sys.modules, "main", fake_main)
+
+    item = {"case_id": "ewca/civ/2023/1", "title": "A v B", "date": "2023-01-01", "court": "EWCA",
+            "xml_link": "https://example.invalid/data.xml", "source_updated": "2023-01-02"}
+    claims = [[item], []]
+    released = []
+    heartbeats = []
+
+    def heartbeat(worker_id):
+        heartbeats.append(_Heartbeat(worker_id))
+        return heartbeats[-1]
+
+    monkeypatch.setattr(queue, "ensure_queue_tables", lambda: None)
+    monkeypatch.setattr(queue, "claim", lambda worker_id: claims.pop(0) if claims else [])
+    monkeypatch.setattr(queue, "release", lambda *args: released.append(args))
+    monkeypatch.setattr(queue, "Heartbeat", heartbeat)
+    monkeypatch.setattr(worker, "POLL_SECONDS", 0)
+
+    worker.run_worker("test-worker", exit_when_idle=0)
+
+    assert released == [("test-worker", item["case_id"], "done")]
+    assert heartbeats[0].finished_calls == [True]
@@ -4,6 +4,7 @@ import xml.etree.ElementTree as ET
 from lxml import etree
 import logging
 import re
+from utils.prompt_input import tag_decision
 
 # Logging setup
 logging.basicConfig(
@@ -18,9 +19,9 @@ namespaces = {
     'akn': 'http://docs.oasis-open.org/legaldocml/ns/akn/3.0',
     'uk': 'https://caselaw.nationalarchives.gov.uk/akn'}
 UK_NS = 'https://caselaw.nationalarchives.gov.uk/akn'
+AKN_NS = 'http://docs.oasis-open.org/legaldocml/ns/akn/3.0'
 
-def build_case_url(citation): 
-    pattern = r"""
+CITATION_PATTERN = re.compile(r"""
     \[(?P<year>\d{4})\]                # year in square brackets
     \s+
     (?P<court>[A-Z]+)                 # court (EWHC, EWCA, UKFTT)
@@ -28,8 +29,18 @@ def build_case_url(citation):
     \s+
     (?P<number>\d+)                   # case number
     (?:\s+\((?P<subdivision>[^)]+)\))? # optional (Ch), (QB), etc.
+    """, re.VERBOSE)
+
+def parse_citation(citation):
+    """
+    Parse a neutral citation like "[2023] EWHC 123 (Ch)" into its year, court,
+    division, number and subdivision, or None if it is not one
     """
-    match = re.search(pattern, citation, re.VERBOSE)
+    match = CITATION_PATTERN.search(citation)
+    return match.groupdict() if match else None
+
+def build_case_url(citation): 
+    match = CITATION_PATTERN.search(citation)
     if not match:
         return "No Citation Found"    #Filter out parts that are None 
 
@@ -94,6 +105,41 @@ def get_cited_cases(et_entry, lxml_entry):
         })
     return cases_cited
 
+def collect_cited_cases(judgement_root):
+    """
+    Single-pass version of get_cited_cases over one lxml tree. Takes each
+    citation's context from the ref's own paragraph instead of searching the
+    whole document again for every citation.
+    """
+    cases_cited = []
+    seen = set()
+
+    for ref in judgement_root.iter(f'{{{AKN_NS}}}ref'):
+        if ref.get(f'{{{UK_NS}}}type') != 'case':
+            continue
+        if ref.get(f'{{{UK_NS}}}isNeutral') != 'true':
+            continue
+
+        citation_text = ref.get(f'{{{UK_NS}}}canonical')
+        if not citation_text:
+            continue
+
+        citation_text = normalize_citation(citation_text)
+        if citation_text in seen:
+            continue
+        seen.add(citation_text)
+
+        context = None
+        para = ref.xpath("ancestor::*[local-name()='p'][1]")
+        if para:
+            context = para[0].xpath("string(.)").strip()[:300]
+
+        cases_cited.append({
+            "citation_text": citation_text,
+            "context": context
+        })
+    return cases_cited
+
 def get_nuetral_citation(entry): 
     cite_elem = entry.find('.//akn:proprietary/uk:cite', namespaces)
     if cite_elem is not None and cite_elem.text:
@@ -143,13 +189,13 @@ def extract_and_process_citations(case_id, xml_url):
             - 'error': Error message if unsuccessful (None if successful)
     """
     try:
-        et_root, lxml_root = extract_from_xml(xml_url)
+        judgement_root = fetch_judgment(xml_url)
         
         # Extract neutral citation
-        neutral_citation = get_nuetral_citation(et_root)
+        neutral_citation = get_nuetral_citation(judgement_root)
         
         # Extract cited cases
-        cited_cases = get_cited_cases(et_root, lxml_root)
+        cited_cases = collect_cited_cases(judgement_root)
         
         return {
             'case_id': case_id,
@@ -246,25 +292,80 @@ def extract_case(entry):
 
     return title, date, court, xml_link
 
-def case_content(xml_link):
+def get_feed_citation(entry):
     """
-    Download case xml file and parse to extract:
-    case judgement 
-    first 10 paragraphs
+    Extract the neutral citation a feed entry carries, if any
     """
-    output = []
+    identifier = entry.find("tna:identifier[@type='ukncn']", namespaces)
+    if identifier is not None and identifier.text:
+        return identifier.text.strip()
+    return None
 
-    # Fetch XML
-    case_text = requests.get(xml_link)
-    logging.info(f"Status: {case_text.status_code}")
+def get_updated(entry):
+    """
+    Extract the feed's <updated> timestamp, which changes when a judgment is republished
+    """
+    updated_tag = entry.find('atom:updated', namespaces)
+    if updated_tag is not None and updated_tag.text:
+        return updated_tag.text.strip()
+    return None
 
-    judgement_root = etree.fromstring(case_text.content)
+def fetch_judgment(xml_link):
+    """
+    Download a case xml file and return its parsed lxml root
+    """
+    response = requests.get(xml_link)
+    logging.info(f"Status: {response.status_code}")
+    response.raise_for_status()
+    return etree.fromstring(response.content)
+
+def extract_case_from_xml(judgement_root, xml_link):
+    """
+    Extract case metadata (case id, title, date, court) from the judgment xml
+    itself, for cases that were never seen in the Atom feed
+    """
+    frbr_this = judgement_root.find('.//akn:FRBRWork/akn:FRBRthis', namespaces)
+    if frbr_this is not None and frbr_this.get('value'):
+        case_uri = frbr_this.get('value')
+    else:
+        case_uri = xml_link
+    case_id = re.sub(r"^https?://caselaw\.nationalarchives\.gov\.uk/", "", case_uri)
+    case_id = re.sub(r"/data\.xml$", "", case_id)
+
+    name_elem = judgement_root.find('.//akn:FRBRWork/akn:FRBRname', namespaces)
+    title = name_elem.get('value').strip() if name_elem is not None and name_elem.get('value') else 'Unknown'
+
+    date_elem = judgement_root.find('.//akn:FRBRWork/akn:FRBRdate', namespaces)
+    date = date_elem.get('date') if date_elem is not None and date_elem.get('date') else 'Unknown'
+
+    # Prefer the court's display name, as the Atom feed uses, over the uk:court code
+    court = 'Unknown'
+    author_elem = judgement_root.find('.//akn:FRBRWork/akn:FRBRauthor', namespaces)
+    if author_elem is not None and author_elem.get('href'):
+        org = judgement_root.find(
+            f".//akn:TLCOrganization[@eId='{author_elem.get('href').lstrip('#')}']", namespaces)
+        if org is not None and org.get('showAs'):
+            court = org.get('showAs')
+    if court == 'Unknown':
+        court_elem = judgement_root.find('.//uk:court', namespaces)
+        if court_elem is not None and court_elem.text:
+            court = court_elem.text.strip()
+
+    return case_id, title, date, court
+
+def parse_case_content(judgement_root):
+    """
+    Parse a judgment xml root to extract:
+    case judgement (tagged, see utils.prompt_input.DECISION_TAG)
+    first 10 paragraphs
+    """
+    output = []
 
     # Get Case Judgement
     outcome = judgement_root.xpath(
         "//*[local-name()='decision']//*[local-name()='p']/text()"
     )
-    output += outcome
+    output += [tag_decision(text) for text in outcome]
 
     paragraphs = []
 
@@ -288,4 +389,17 @@ def case_content(xml_link):
     for i, (num, text) in enumerate(paragraphs[:10], 1):
         output.append(f"{num}. {text}")
 
-    return output
\ No newline at end of file
+    return output
+
+def case_content(xml_link):
+    """
+    Download case xml file and parse to extract:
+    case judgement 
+    first 10 paragraphs
+    """
+    # Fetch XML
+    case_text = requests.get(xml_link)
+    logging.info(f"Status: {case_text.status_code}")
+
+    judgement_root = etree.fromstring(case_text.content)
+    return parse_case_content(judgement_root)
@@ -0,0 +1,76 @@
+"""Content hashes and MinHash signatures for judgment text."""
+import re
+import hashlib
+import numpy as np
+from utils.prompt_input import untag
+
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+# 16 bands of 8 rows: pairs above ~0.7 Jaccard usually share a band
+LSH_BANDS = 16
+NEAR_DUPLICATE_THRESHOLD = 0.9
+
+# Fixed multiply-shift hash family, so signatures stay comparable across runs
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, 2**32, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.randint(0, 2**32, size=NUM_PERM, dtype=np.uint64)
+
+
+def canonical_text(content):
+    """
+    Join case_content output (a list of passages) or a string into one
+    lower-cased, whitespace-normalised text. Decision tags are dropped, so
+    hashes match those of text stored before passages were tagged.
+    """
+    if not isinstance(content, str):
+        content = " ".join(untag(p)[1] for p in content or [])
+    return re.sub(r"\s+", " ", content).strip().lower()
+
+
+def content_hash(content):
+    """
+    SHA-256 of the canonical text
+    """
+    return hashlib.sha256(canonical_text(content).encode("utf-8")).hexdigest()
+
+
+def _shingle_hashes(text):
+    words = re.findall(r"\w+", text)
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)]
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64,
+    )
+
+
+def minhash(content):
+    """
+    MinHash signature (uint32[NUM_PERM]) over 5-word shingles of the canonical text
+    """
+    hashes = _shingle_hashes(canonical_text(content))
+    with np.errstate(over="ignore"):
+        permuted = (hashes[:, None] * _A[None, :] + _B[None, :]) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def similarity(signature, other):
+    """
+    Estimated Jaccard similarity of two signatures
+    """
+    return float(np.mean(np.asarray(signature) == np.asarray(other)))
+
+
+def lsh_bands(signature):
+    """
+    One signed 64-bit hash per band, for candidate lookup in the database
+    """
+    rows = NUM_PERM // LSH_BANDS
+    signature = np.asarray(signature, dtype=np.uint32)
+    return [
+        int.from_bytes(hashlib.blake2b(signature[b * rows:(b + 1) * rows].tobytes(), digest_size=8).digest(),
+                       "little", signed=True)
+        for b in range(LSH_BANDS)
+    ]
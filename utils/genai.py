@@ -5,10 +5,9 @@ import re
 import json 
 import sys
 import time
-from sentence_transformers import SentenceTransformer
 import logging
-import torch 
 from dotenv import load_dotenv
+from utils.prompt_input import build_prompt_input
 load_dotenv()
 
 # Logging setup
@@ -46,10 +45,25 @@ def load_nlp():
     nlp_model = spacy.load("en_core_web_sm")
     return nlp_model
 
-def load_model():
+def load_model(backend=None):
     """
     Load and return embedding model.
-    """
+    backend: "torch" (default), "onnx" or "onnx-int8". Falls back to the
+    EMBEDDING_BACKEND environment variable when not given.
+    """
+    backend = (backend or os.environ.get("EMBEDDING_BACKEND", "torch")).lower()
+
+    if backend in ("onnx", "onnx-int8"):
+        from utils import onnx_encoder
+        quantized = backend == "onnx-int8"
+        fp32_path, int8_path, _ = onnx_encoder.model_paths()
+        if not os.path.exists(int8_path if quantized else fp32_path):
+            logging.info("No exported ONNX encoder found, exporting one now")
+            onnx_encoder.export_onnx(quantize=quantized)
+        return onnx_encoder.OnnxEncoder(quantized=quantized)
+
+    # Imported lazily so the ONNX backend never pays for torch
+    from sentence_transformers import SentenceTransformer
     embedding_model = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
     return embedding_model
 
@@ -63,7 +77,8 @@ def produce_summary(text, model):
     """
     Use Gemini API to produce summary of each case 
     """
-    
+    text = build_prompt_input(text)
+
     prompt = f"""
     You are an expert legal assistant specialized in summarizing legal case documents. Your task is to provide a concise summary of the provided "Legal Case" text.
 
@@ -105,7 +120,8 @@ def extract_keywords(text, model):
     """
     Use Gemini API to generate keywords and tags from case content
     """
-        
+    text = build_prompt_input(text)
+
     prompt = f"""
         You are a legal keyword extraction assistant. 
 
@@ -192,11 +208,10 @@ def extract_user_keywords(text, model):
     except Exception as e:
         logging.error(f"Error: {e}")
 
-def filter_input(text, model):
+def redact_doc(text, doc):
     """
-    Redact user input to remove personal information
+    Replace person, location and date entities found in a parsed doc
     """
-    doc = model(text)
     filtered = text
     for ent in reversed(list(doc.ents)):
         if ent.label_ == "PERSON":
@@ -206,3 +221,16 @@ def filter_input(text, model):
         elif ent.label_ == "DATE":
                 filtered = filtered[:ent.start_char] + "[DATE]" + filtered[ent.end_char:]
     return filtered
+
+def filter_input(text, model):
+    """
+    Redact user input to remove personal information
+    """
+    return redact_doc(text, model(text))
+
+def filter_inputs(texts, model, batch_size=64):
+    """
+    Redact a batch of inputs in one spaCy pipe pass
+    """
+    texts = list(texts)
+    return [redact_doc(text, doc) for text, doc in zip(texts, model.pipe(texts, batch_size=batch_size))]
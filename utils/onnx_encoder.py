@@ -0,0 +1,176 @@
+"""ONNX Runtime backend for the all-MiniLM-L6-v2 sentence encoder."""
+import os
+import logging
+import numpy as np
+
+# Logging setup
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+ONNX_DIR = os.environ.get("ONNX_MODEL_DIR", os.path.join("models", "minilm-onnx"))
+MAX_SEQ_LENGTH = 256
+
+# Sentences used to compare the ONNX encoder against the torch encoder
+PARITY_TEXTS = [
+    "fraudulent misrepresentation under contract law",
+    "The appellant appeals against the decision of the First-tier Tribunal.",
+    "Legal Concepts: negligence, duty of care, causation. Factual Circumstances: slip on a wet floor in a supermarket.",
+    "Whether the landlord served a valid section 21 notice before seeking possession of the property",
+    "breach",
+]
+
+
+def model_paths(model_dir=ONNX_DIR):
+    """
+    Return the paths of the fp32 model, the int8 model and the tokenizer
+    """
+    return (
+        os.path.join(model_dir, "model.onnx"),
+        os.path.join(model_dir, "model-int8.onnx"),
+        os.path.join(model_dir, "tokenizer.json"),
+    )
+
+
+def export_onnx(model_dir=ONNX_DIR, quantize=True):
+    """
+    Export the MiniLM transformer to ONNX, optionally with a dynamically
+    quantized int8 copy. Needs torch and sentence-transformers, so run it once
+    offline and ship the resulting directory.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    class _LastHiddenState(torch.nn.Module):
+        # ONNX export wants a plain tensor output rather than a ModelOutput
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.transformer(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids,
+            )[0]
+
+    fp32_path, int8_path, _ = model_paths(model_dir)
+    os.makedirs(model_dir, exist_ok=True)
+
+    st_model = SentenceTransformer(MODEL_NAME, device='cpu')
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(model_dir)  # writes tokenizer.json
+
+    wrapper = _LastHiddenState(st_model[0].auto_model).eval()
+    dummy = tokenizer(["export the encoder"], return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"}
+                    for name in ("input_ids", "attention_mask", "token_type_ids", "last_hidden_state")}
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper,
+            (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    logging.info(f"Exported ONNX encoder to {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        logging.info(f"Wrote int8 quantized encoder to {int8_path}")
+
+    return model_dir
+
+
+class OnnxEncoder:
+    """
+    Drop-in replacement for SentenceTransformer.encode backed by onnxruntime.
+    Applies the same mean pooling and L2 normalisation as all-MiniLM-L6-v2.
+    """
+
+    def __init__(self, model_dir=ONNX_DIR, quantized=True, num_threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        fp32_path, int8_path, tokenizer_path = model_paths(model_dir)
+        model_path = int8_path if quantized else fp32_path
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+        self.quantized = quantized
+        logging.info(f"Loaded ONNX encoder from {model_path}")
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        hidden = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real tokens, then normalise like the torch pipeline
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        """
+        Encode a string or a list of strings. Returns a 1-D array for a single
+        string and a 2-D array otherwise, like SentenceTransformer.encode.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 384), dtype=np.float32)
+
+        # Sort by length so each batch pads to a similar size
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        output = np.empty((len(texts), 384), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            output[idx] = self._encode_batch([texts[i] for i in idx])
+
+        return output[0] if single else output
+
+
+def check_parity(onnx_model, torch_model=None, texts=PARITY_TEXTS, min_cosine=0.98):
+    """
+    Compare ONNX embeddings with the torch encoder and return the lowest
+    cosine similarity. Raises ValueError if it falls below `min_cosine`.
+    """
+    if torch_model is None:
+        from sentence_transformers import SentenceTransformer
+        torch_model = SentenceTransformer(MODEL_NAME, device='cpu')
+
+    expected = np.asarray(torch_model.encode(list(texts)), dtype=np.float32)
+    actual = onnx_model.encode(list(texts))
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    cosines = (expected * actual).sum(axis=1)
+    worst = float(cosines.min())
+
+    logging.info(f"ONNX parity: min cosine {worst:.5f}, mean cosine {float(cosines.mean()):.5f}")
+    if worst < min_cosine:
+        raise ValueError(f"ONNX encoder drifted from torch encoder: min cosine {worst:.5f} < {min_cosine}")
+    return worst
+
+
+if __name__ == "__main__":
+    export_onnx()
+    check_parity(OnnxEncoder(quantized=False), min_cosine=0.999)
+    check_parity(OnnxEncoder(quantized=True))
@@ -0,0 +1,173 @@
+"""
+Opt-in profiling for single searches and ingestion cases.
+
+    PROFILE_SAMPLE_RATE=0.01   profile 1% of wrapped calls (default 0: only forced ones)
+    PROFILE_MODE=sample        "sample" (stack sampler, low overhead) or "cprofile"
+    PROFILE_INTERVAL_MS=5      sampling interval
+    PROFILE_MEMORY=auto        record top allocation sites with tracemalloc: "auto" for
+                               forced profiles only (it slows allocation-heavy code a
+                               lot), "1" for every profile, "0" never
+    PROFILE_DIR=profiles       output directory
+    PROFILE_CASES=id1,id2      ingestion cases to always profile
+    PROFILE_ALLOW_QUERY=1      let ?profile=1 in the app URL force a search profile
+                               (off by default: any visitor could set it)
+
+Each profiled call writes <name>-<timestamp> files to PROFILE_DIR: a .folded
+file of collapsed stacks (flamegraph.pl, speedscope, inferno) in sample mode,
+or a .prof pstats dump (snakeviz, flameprof) in cprofile mode, plus an
+.allocs.txt listing the top allocation sites.
+"""
+import os
+import sys
+import time
+import random
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+# Logging setup
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+MODE = os.environ.get("PROFILE_MODE", "sample").lower()
+INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+MEMORY = os.environ.get("PROFILE_MEMORY", "auto").lower()
+FORCED_CASES = set(filter(None, os.environ.get("PROFILE_CASES", "").split(",")))
+ALLOW_QUERY = os.environ.get("PROFILE_ALLOW_QUERY", "0") == "1"
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 10
+
+# tracemalloc is process-wide; overlapping profiles share one tracing session
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def should_profile(force=False):
+    """
+    True for forced calls and for a PROFILE_SAMPLE_RATE fraction of the rest
+    """
+    return force or (SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE)
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a
+    background thread and counts collapsed stacks
+    """
+
+    def __init__(self, thread_id, interval=INTERVAL_MS / 1000):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write_folded(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        _tracemalloc_users += 1
+    return tracemalloc.take_snapshot()
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    snapshot = tracemalloc.take_snapshot()
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+    return snapshot
+
+
+def write_allocations(path, before, after, elapsed, limit=TOP_ALLOCATIONS):
+    """
+    Write the allocation sites that grew most between two tracemalloc snapshots
+    """
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "traceback")
+    with open(path, "w") as f:
+        f.write(f"# wall {elapsed:.3f}s; allocations from all threads while profiling\n")
+        for stat in stats[:limit]:
+            f.write(f"{stat.size_diff / 1024:+.1f} KiB in {stat.count_diff:+d} blocks "
+                    f"(now {stat.size / 1024:.1f} KiB)\n")
+            for line in stat.traceback.format(most_recent_first=True)[:TRACEMALLOC_FRAMES * 2]:
+                f.write(f"    {line}\n")
+
+
+@contextmanager
+def profile(name, force=False):
+    """
+    Profile the enclosed block when sampled (see should_profile) and write the
+    results to PROFILE_DIR. Yields the output path prefix, or None when the
+    block runs unprofiled.
+    """
+    if not should_profile(force):
+        yield None
+        return
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)[:80]
+    prefix = os.path.join(PROFILE_DIR, f"{safe_name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+
+    track_memory = MEMORY == "1" or (MEMORY == "auto" and force)
+    before = _start_tracemalloc() if track_memory else None
+    if MODE == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = StackSampler(threading.get_ident())
+        profiler.start()
+    start = time.perf_counter()
+
+    try:
+        yield prefix
+    finally:
+        elapsed = time.perf_counter() - start
+        if MODE == "cprofile":
+            profiler.disable()
+        else:
+            profiler.stop()
+        after = _stop_tracemalloc() if before is not None else None
+        try:
+            if MODE == "cprofile":
+                profiler.dump_stats(prefix + ".prof")
+            else:
+                profiler.write_folded(prefix + ".folded")
+            if after is not None:
+                write_allocations(prefix + ".allocs.txt", before, after, elapsed)
+            logging.info(f"Profiled {name} ({elapsed:.2f}s) to {prefix}.*")
+        except Exception as e:
+            logging.error(f"Could not write profile for {name}: {e}")
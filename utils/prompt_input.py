@@ -0,0 +1,148 @@
+"""Build the case text passed to the enrichment prompts, within a token budget."""
+import os
+import re
+import math
+import logging
+
+# Logging setup
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", 4000))
+# Share of the budget decision passages may take before background gets a turn
+DECISION_SHARE = 0.6
+MIN_PASSAGE_CHARS = 3
+# A cut-off passage is only worth including if this much budget is left for it
+MIN_TRUNCATED_TOKENS = 40
+
+# parse_case_content marks the passages of a judgment's <decision> element with this prefix
+DECISION_TAG = "[decision] "
+
+
+def tag_decision(text):
+    """
+    Mark a passage as coming from the judgment's <decision> element
+    """
+    return DECISION_TAG + text
+
+
+def untag(passage):
+    """
+    Split a case_content passage into (is_decision, text)
+    """
+    passage = str(passage)
+    if passage.startswith(DECISION_TAG):
+        return True, passage[len(DECISION_TAG):]
+    return False, passage
+
+
+def estimate_tokens(text):
+    """
+    Rough local token count: one token per punctuation mark and one per
+    four characters of each word, close enough to Gemini's tokenizer for budgeting
+    """
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in re.findall(r"\w+|[^\w\s]", text))
+
+
+def clean_passage(text):
+    """
+    Collapse whitespace and tidy the "1.. text" numbering case_content produces
+    """
+    text = re.sub(r"\s+", " ", str(text)).strip()
+    return re.sub(r"^(\S*?)\.\.\s", r"\1. ", text)
+
+
+def dedupe_passages(passages, decision=frozenset()):
+    """
+    Drop repeated passages and passages contained in a longer one, keeping
+    document order. `decision` holds the indices of tagged passages; a dropped
+    one passes its tag to the passage that contains it. Returns a list of
+    (index, passage) and the indices of kept decision passages.
+    """
+    order = sorted(range(len(passages)), key=lambda i: -len(passages[i]))
+    kept = []
+    decision_ids = set()
+    for i in order:
+        key = passages[i].casefold()
+        container = next((j for j, kept_key in kept if key in kept_key), None)
+        if container is None:
+            kept.append((i, key))
+            container = i
+        if i in decision:
+            decision_ids.add(container)
+    return [(i, passages[i]) for i in sorted(i for i, _ in kept)], decision_ids
+
+
+def _truncate(text, tokens):
+    """
+    Cut text to roughly `tokens` tokens at a sentence or word boundary
+    """
+    cut = text[:tokens * 4]
+    sentence_end = max(cut.rfind(". "), cut.rfind("; "))
+    if sentence_end > len(cut) // 2:
+        return cut[:sentence_end + 1]
+    return cut.rsplit(" ", 1)[0] + " ..."
+
+
+def _fill(passages, budget):
+    """
+    Take passages in order while they fit; returns (chosen, tokens used, leftovers)
+    """
+    chosen, used, rest = [], 0, []
+    for i, text in passages:
+        tokens = estimate_tokens(text)
+        if used + tokens <= budget:
+            chosen.append((i, text))
+            used += tokens
+        else:
+            rest.append((i, text))
+    return chosen, used, rest
+
+
+def build_prompt_input(content, budget=None):
+    """
+    Turn case_content output (a list of passages, or a string) into clean
+    prompt text: passages joined as plain paragraphs, duplicates removed, and
+    at most `budget` estimated tokens. Decision passages (tagged by
+    parse_case_content) are taken first, then background in document order;
+    the first passage that does not fit is truncated rather than dropped when
+    enough budget remains.
+    """
+    budget = TOKEN_BUDGET if budget is None else budget
+    if isinstance(content, str):
+        content = content.split("\n\n")
+    tagged = [(is_decision, clean_passage(text)) for is_decision, text in map(untag, content or [])]
+    tagged = [(is_decision, p) for is_decision, p in tagged if len(p) >= MIN_PASSAGE_CHARS]
+    passages, decision_ids = dedupe_passages([p for _, p in tagged],
+                                             {i for i, (is_decision, _) in enumerate(tagged) if is_decision})
+
+    decision = [(i, p) for i, p in passages if i in decision_ids]
+    background = [(i, p) for i, p in passages if i not in decision_ids]
+
+    chosen_decision, used, decision_rest = _fill(decision, int(budget * DECISION_SHARE))
+    chosen_background, background_used, background_rest = _fill(background, budget - used)
+    used += background_used
+    # Whatever background left over goes back to the decision passages
+    more_decision, more_used, decision_rest = _fill(decision_rest, budget - used)
+    chosen_decision += more_decision
+    used += more_used
+
+    remaining = budget - used
+    for i, text in sorted(decision_rest + background_rest):
+        if remaining >= MIN_TRUNCATED_TOKENS:
+            target = chosen_decision if i in decision_ids else chosen_background
+            target.append((i, _truncate(text, remaining)))
+        break
+
+    sections = []
+    if chosen_decision:
+        sections.append("Decision:\n" + "\n".join(p for _, p in sorted(chosen_decision)))
+    if chosen_background:
+        sections.append("Background:\n" + "\n".join(p for _, p in sorted(chosen_background)))
+    prompt_input = "\n\n".join(sections)
+
+    logging.info(f"Prompt input: {len(passages)} unique passages, kept "
+                 f"{len(chosen_decision) + len(chosen_background)}, ~{estimate_tokens(prompt_input)} tokens")
+    return prompt_input
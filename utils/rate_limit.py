@@ -0,0 +1,36 @@
+import threading
+import time
+
+
+class RateBudget:
+    """
+    Thread-safe token bucket shared by concurrent workers.
+    Allows `rate_per_minute` calls per minute with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate_per_minute, burst=1):
+        if rate_per_minute <= 0:
+            raise ValueError(f"rate_per_minute must be positive, got {rate_per_minute}")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """
+        Block until `tokens` are available, then spend them
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,137 @@
+"""
+Sharded ingestion through the ingest_queue table.
+
+    python worker.py --feed                  # walk the Atom feed and queue new or republished cases
+    python worker.py                         # claim and ingest queued cases until stopped
+    python worker.py --exit-when-idle 600    # ...or until the queue has been empty for 10 minutes
+
+Any number of workers can run at once, on any machine: each case is leased
+to one worker at a time, so no two workers spend Gemini calls on it.
+"""
+import os
+import time
+import uuid
+import socket
+import argparse
+import logging
+from datetime import datetime, timedelta, timezone
+from db.connection import conn
+import db.work_queue as queue
+import db.fingerprints as FP
+import db.check as db
+import utils.api as source
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+FEED_PAGE_DELAY = int(os.environ.get("FEED_PAGE_DELAY", 10))
+POLL_SECONDS = 15
+# Delay before a case that crashed the worker's ingestion call is offered again
+RETRY_SECONDS = 300
+
+
+def feed_queue(max_known=0, delay=FEED_PAGE_DELAY):
+    """
+    Queue every feed entry that is not ingested yet or was republished.
+    Stops after `max_known` consecutive up-to-date entries (0 walks the whole feed).
+    """
+    queue.ensure_queue_tables()
+    queue.prune_workers()
+    FP.ensure_fingerprint_tables()
+    db.ensure_case_lookup_indexes()
+
+    queued, known_run, page = 0, 0, []
+    for entry in source.fetch_page(delay=delay):
+        title, date, court, xml_link = source.extract_case(entry)
+        case_id = db.resolve_case_id(source.get_caseid(entry), xml_link, source.get_feed_citation(entry))
+        updated = source.get_updated(entry)
+        if FP.is_up_to_date(case_id, updated):
+            known_run += 1
+            if max_known and known_run >= max_known:
+                logger.info(f"{known_run} consecutive cases already ingested, stopping.")
+                break
+            continue
+        known_run = 0
+
+        page.append({"case_id": case_id, "title": title, "date": date, "court": court,
+                     "xml_link": xml_link, "source_updated": updated})
+        if len(page) >= 50:
+            queued += queue.enqueue(page)
+            page = []
+    queued += queue.enqueue(page)
+
+    logger.info(f"Queued {queued} cases; queue now {queue.queue_depth()}")
+    return queued
+
+
+def run_worker(worker_id, exit_when_idle=None):
+    """
+    Claim queued cases one at a time and run them through main.ingest_case,
+    heartbeating and renewing the lease while each one is processed
+    """
+    # Imported here so the feeder never loads the models
+    from main import ensure_tables, ingest_case
+
+    ensure_tables()
+    queue.ensure_queue_tables()
+    heartbeat = queue.Heartbeat(worker_id)
+    heartbeat.start()
+    logger.info(f"Worker {worker_id} started")
+
+    idle_since = time.monotonic()
+    try:
+        while True:
+            claimed = queue.claim(worker_id)
+            if not claimed:
+                if exit_when_idle is not None and time.monotonic() - idle_since >= exit_when_idle:
+                    logger.info(f"Queue idle for {exit_when_idle}s, worker {worker_id} exiting.")
+                    break
+                time.sleep(POLL_SECONDS)
+                continue
+
+            item = claimed[0]
+            case_id = item["case_id"]
+            heartbeat.working_on(case_id)
+            try:
+                entry = ingest_case(case_id, item["title"], item["date"], item["court"], item["xml_link"],
+                                    item["source_updated"])
+            except Exception as e:
+                logger.error(f"Worker {worker_id} could not ingest {case_id}: {e}")
+                conn.rollback()
+                queue.release(worker_id, case_id, "queued", datetime.now(timezone.utc) + timedelta(seconds=RETRY_SECONDS))
+                heartbeat.finished(False)
+                continue
+
+            if entry["status"] in ("retry", "active"):
+                #Back to the queue once the journal's backoff has passed
+                queue.release(worker_id, case_id, "queued", entry.get("next_attempt_at"))
+            else:
+                queue.release(worker_id, case_id, entry["status"])
+            heartbeat.finished(entry["status"] == "done")
+            idle_since = time.monotonic()
+    finally:
+        heartbeat.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feed", action="store_true", help="fill the queue from the Atom feed and exit")
+    parser.add_argument("--max-known", type=int, default=0,
+                        help="with --feed, stop after this many consecutive already-ingested entries")
+    parser.add_argument("--exit-when-idle", type=int, metavar="SECONDS",
+                        help="exit once no case could be claimed for this long")
+    parser.add_argument("--worker-id", default=os.environ.get("WORKER_ID"))
+    args = parser.parse_args()
+
+    if args.feed:
+        feed_queue(args.max_known)
+    else:
+        worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        run_worker(worker_id, args.exit_when_idle)
+
+
+if __name__ == "__main__":
+    main()